@@ -1,21 +1,151 @@
 import os
 import datetime as dt
-import ollama
+import json
+import math
+from typing import Dict, List, Tuple
 import pandas as pd
 import pytz
 import streamlit as st
 
-from src import UI_CONTEXT_PROMPT, DBManager, NewsFetcher, PLOT_CONTEXT_PROMPT
-from settings import REGIONS, AVAILABLE_MODELS, MARKETS, DB_PATH, DEFAULT_START_DATE, HTTP_TIMEOUT
+from src import (
+    UI_CONTEXT_PROMPT, DBManager, LLMCache, NewsFetcher, PLOT_CONTEXT_PROMPT, METRICS, Metrics, StoryClusterer,
+    ChatJob, compact_table,
+)
+from settings import (
+    REGIONS, AVAILABLE_MODELS, MARKETS, DB_PATH, HTTP_TIMEOUT, DASHBOARD_READ_ONLY, TRIAGE_TIERS, ITEMS_PAGE_SIZE,
+    ITEMS_TABLE_PAGE_SIZE, CHAT_POLL_INTERVAL,
+)
 
 st.set_page_config(page_title="NBIM Regulatory News Dashboard", layout="wide")
 st.title("Regulatory news dashboard")
 st.logo(os.path.join("figures", "logo.svg"), size="large")
 
-db_manager = DBManager(DB_PATH)
-db_manager.init()
 
-fetcher = NewsFetcher(time_out=HTTP_TIMEOUT, utc=pytz.UTC)
+@st.cache_resource
+def get_db_manager() -> DBManager:
+    db_manager = DBManager(DB_PATH)
+    db_manager.init()
+    return db_manager
+
+
+@st.cache_resource
+def get_llm_cache() -> LLMCache:
+    llm_cache = LLMCache(DB_PATH)
+    llm_cache.init()
+    return llm_cache
+
+
+@st.cache_resource
+def get_clusterer() -> StoryClusterer:
+    clusterer = StoryClusterer(DB_PATH)
+    clusterer.init()
+    return clusterer
+
+
+# Every cached query takes the database generation as an argument, so a refresh that
+# writes rows changes the cache key and stale results are simply never looked up again.
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_page(
+        region: str,
+        start_date: dt.date,
+        end_date: dt.date,
+        markets: Tuple[str, ...],
+        search_query: str,
+        order_by: str,
+        limit: int,
+        offset: int,
+        collapse: bool,
+        generation: int,
+    ) -> List[Dict]:
+    filters = dict(region=region, start_date=start_date, end_date=end_date, markets_filter=list(markets),
+                   order_by=order_by, limit=limit, offset=offset, collapse=collapse)
+    if search_query:
+        return get_db_manager().search(search_query, **filters)
+    return get_db_manager().get(**filters)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_count(
+        region: str,
+        start_date: dt.date,
+        end_date: dt.date,
+        markets: Tuple[str, ...],
+        search_query: str,
+        collapse: bool,
+        generation: int,
+    ) -> int:
+    filters = dict(region=region, start_date=start_date, end_date=end_date, markets_filter=list(markets),
+                   collapse=collapse)
+    if search_query:
+        return get_db_manager().search_count(search_query, **filters)
+    return get_db_manager().count(**filters)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_region_stats(
+        regions: Tuple[str, ...],
+        start_date: dt.date,
+        end_date: dt.date,
+        markets: Tuple[str, ...],
+        generation: int,
+    ) -> pd.DataFrame:
+    return get_db_manager().daily_region_stats(
+        region=list(regions),
+        start_date=start_date,
+        end_date=end_date,
+        markets_filter=list(markets),
+    )
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_market_stats(
+        regions: Tuple[str, ...],
+        start_date: dt.date,
+        end_date: dt.date,
+        markets: Tuple[str, ...],
+        generation: int,
+    ) -> pd.DataFrame:
+    return get_db_manager().daily_market_stats(
+        region=list(regions),
+        start_date=start_date,
+        end_date=end_date,
+        markets=list(markets),
+    )
+
+
+def write_reply(job: ChatJob) -> None:
+    if job.error:
+        st.error(f"The model could not answer: {job.error}")
+    elif job.done:
+        st.write(job.text)
+    else:
+        st.write(job.text + " ▌")
+
+
+# Replies are generated on a background executor and streamed into the page by a fragment
+# that reruns on its own, so the rest of the dashboard stays usable while the model writes.
+# Only a pending reply polls: once it is done, one full rerun draws it without the fragment.
+@st.fragment(run_every=CHAT_POLL_INTERVAL)
+def stream_reply(key: str) -> None:
+    job = st.session_state.get(key)
+    if job is None:
+        return
+    if job.done:
+        st.rerun(scope="app")
+    write_reply(job)
+
+
+def show_reply(key: str) -> None:
+    job = st.session_state.get(key)
+    if job is None:
+        return
+    if job.done:
+        write_reply(job)
+    else:
+        stream_reply(key)
+
+
+db_manager = get_db_manager()
 
 st.sidebar.title("Settings ⚙️️")
 
@@ -28,8 +158,13 @@ with st.sidebar.expander("Regions", expanded=True):
     selected_regions = st.pills(label="region", options=countries, selection_mode="multi", default=countries,
                                 label_visibility="hidden")
 
+with st.sidebar.expander("Search", expanded=True):
+    search_query = st.text_input(label="Search", placeholder="e.g. basel, \"stress test\"",
+                                 label_visibility="hidden")
+
 with st.sidebar.expander("Sort by", expanded=True):
-    sort_by = st.selectbox(label="Sort by", options= ["Score", "Date"], index=0, label_visibility="hidden")
+    sort_options = ["Relevance", "Score", "Date"] if search_query else ["Score", "Date"]
+    sort_by = st.selectbox(label="Sort by", options=sort_options, index=0, label_visibility="hidden")
 
 with st.sidebar.expander("Period", expanded=True):
     today = dt.date.today()
@@ -41,115 +176,181 @@ with st.sidebar.expander("Advanced options", expanded=True):
     use_llm = st.checkbox(label="Deep analysis", value=True)
     if use_llm:
         selected_model = st.selectbox(label="Choose an LLM", options=AVAILABLE_MODELS, index=0)
+        triage_tiers = st.multiselect(label="Screen with", options=["heuristic", *AVAILABLE_MODELS],
+                                      default=TRIAGE_TIERS)
+    layout = st.radio(label="Layout", options=["Cards", "Table"], horizontal=True)
+    collapse_stories = st.checkbox(label="Collapse duplicate stories", value=True)
+    show_diagnostics = st.checkbox(label="Diagnostics", value=False)
 
 col1 = st.columns(1)
 with col1[0]:
-    if st.button("Refresh database"):
-        with st.spinner("Fetching and storing latest items..."):
-            total_new = 0
-            for region in REGIONS:
-                items = fetcher.fetch_news(
-                    region=region,
+    if DASHBOARD_READ_ONLY:
+        st.caption("The database is refreshed in the background by the ingestion service (`python -m src.ingest`).")
+    elif st.button("Refresh database"):
+        # The button writes like an ingester, so it takes the same lock and never runs next to one.
+        from src.ingest import IngestLockError, ingest_lock
+
+        try:
+            with ingest_lock(DB_PATH), st.spinner("Fetching and storing latest items..."):
+                started_at = dt.datetime.now(dt.timezone.utc)
+                before = METRICS.snapshot()
+                fetcher = NewsFetcher(time_out=HTTP_TIMEOUT, utc=pytz.UTC, db_manager=db_manager,
+                                      llm_cache=get_llm_cache(), triage_tiers=triage_tiers if use_llm else [],
+                                      clusterer=get_clusterer())
+                total_new, total_updated = fetcher.refresh(
                     end_date=dt.date.today(),
                     model=selected_model,
                     use_llm=use_llm,
                 )
-                total_new += db_manager.update(items)
-        st.success(f"Updated database with {total_new} items.")
-        st.rerun()
+                db_manager.record_run(
+                    trigger="dashboard",
+                    started_at=started_at,
+                    finished_at=dt.datetime.now(dt.timezone.utc),
+                    inserted=total_new,
+                    updated=total_updated,
+                    failed_sources=len(fetcher.failed_sources),
+                    stats=Metrics.delta(before, METRICS.snapshot()),
+                )
+        except IngestLockError:
+            st.warning("An ingester is writing the database right now; try again when it has finished.")
+        else:
+            st.success(f"Updated database with {total_new} items.")
+            st.rerun()
 
-total_items = []
-for region in selected_regions:
-    items = db_manager.get(
-        region=region,
-        start_date=start_date,
-        end_date=end_date,
-        markets_filter=selected_markets,
-    )
-    total_items.append(items)
+if show_diagnostics:
+    with st.expander("Diagnostics", expanded=True):
+        runs = db_manager.recent_runs()
+        if not runs:
+            st.write("No refresh runs recorded yet.")
+        else:
+            st.dataframe(
+                pd.DataFrame(runs).drop(columns=["stats"]),
+                hide_index=True,
+                width="stretch",
+            )
+            latest = runs[0]
+            st.caption(f"Breakdown of the latest run ({latest['trigger']}, {latest['started_at']})")
+            timers = pd.DataFrame(latest["stats"].get("timers", []), columns=["name", "labels", "count", "total_s",
+                                                                               "max_s"])
+            timers["labels"] = timers["labels"].apply(lambda labels: ", ".join(f"{k}={v}" for k, v in labels.items()))
+            timers["mean_ms"] = 1000 * timers["total_s"] / timers["count"]
+            st.dataframe(timers.sort_values("total_s", ascending=False), hide_index=True, width="stretch")
+            counters = pd.DataFrame(latest["stats"].get("counters", []), columns=["name", "labels", "value"])
+            counters["labels"] = counters["labels"].apply(
+                lambda labels: ", ".join(f"{k}={v}" for k, v in labels.items()))
+            st.dataframe(counters, hide_index=True, width="stretch")
+            st.download_button("Prometheus metrics", data=METRICS.to_prometheus(latest["stats"]),
+                               file_name="refresh_metrics.prom", mime="text/plain")
+
+generation = db_manager.generation()
+query_key = (tuple(selected_regions), start_date, end_date, tuple(selected_markets))
 
-columns = ['id', 'uid', 'title', 'link', 'date', 'time', 'region', 'zone', 'source', *MARKETS,
-           'reasons', 'score', 'summary', 'created_at']
-df = pd.DataFrame([item for items in total_items for item in items], columns=columns)
-df = df.rename(columns={"date": "Day", "region": "Region", "score": "Score"})
 cont = st.container(border=True)
 with cont:
     selected_plot = st.segmented_control(label= "To plot", options=["Region", "Market"], default=["Market", "Region"],
                                          selection_mode="multi", label_visibility="hidden")
     if "Region" in selected_plot:
         col1, col2 = st.columns(2)
+        region_stats = load_region_stats(*query_key, generation=generation)
         with col1:
-            df1 = df[["Day", "Region"]].value_counts().rename("Count").reset_index()
+            df1 = region_stats[["Day", "Region", "Count"]]
             st.line_chart(df1, x="Day", y="Count",
                           color="Region", width=750)
         with col2:
-            df2 = df[df["Score"] > 0]
-            df2 = df2.groupby(["Day", "Region"], as_index=False)["Score"].mean()
+            df2 = region_stats.dropna(subset=["Score"])[["Day", "Region", "Score"]]
             st.line_chart(df2, x="Day", y="Score", color="Region", width=750)
         if st.button("What is happening in the regions?"):
-            df1 = df1.to_dict()
-            df2 = df2.to_dict()
-            resp = ollama.chat(
+            counts = compact_table(region_stats, index="Day", columns="Region", values="Count", aggfunc="sum",
+                                   fill_value=0)
+            scores = compact_table(df2, index="Day", columns="Region", values="Score", aggfunc="mean")
+            st.session_state["regions_reply"] = ChatJob(
                 model=selected_model,
-                messages=[
-                    {"role": "user", "content": UI_CONTEXT_PROMPT + f"Input: {df1} {df2}"}
-                ],
-                options={"temperature": 0.0},
+                prompt=UI_CONTEXT_PROMPT + f"Input: News per day:\n{counts}\nMean score per day:\n{scores}",
             )
-            content = resp.get("message", {}).get("content", "")
-            st.write(content)
+        show_reply("regions_reply")
 
     if "Market" in selected_plot:
         col1, col2 = st.columns(2)
         if not selected_markets:
             selected_markets = MARKETS
+        market_stats = load_market_stats(tuple(selected_regions), start_date, end_date, tuple(selected_markets),
+                                         generation=generation)
         with col1:
-            df1 = df.groupby("Day", as_index=False)[selected_markets].sum()
+            df1 = market_stats.pivot(index="Day", columns="Market", values="Count") \
+                .reindex(columns=selected_markets).fillna(0).reset_index()
             st.line_chart(df1,
                           x="Day", y=selected_markets, y_label="Count", width=750)
         with col2:
-            df2 = df[df["Score"] > 0]
-            df2 = df2.melt(id_vars=['Day', 'Score'], value_vars=selected_markets,
-                           var_name='Market', value_name='Present')
-            df2 = df2[df2['Present'] > 0]
-            df2 = df2.groupby(['Day', 'Market'], as_index=False)['Score'].mean()
+            df2 = market_stats.dropna(subset=["Score"])[["Day", "Market", "Score"]]
             st.line_chart(df2, x="Day", y="Score", color="Market", width=750)
         if st.button("What is happening in the markets?"):
-            df1 = df1.to_dict()
-            df2 = df2.to_dict()
-            resp = ollama.chat(
+            counts = compact_table(market_stats, index="Day", columns="Market", values="Count", aggfunc="sum",
+                                   fill_value=0)
+            scores = compact_table(df2, index="Day", columns="Market", values="Score", aggfunc="mean")
+            st.session_state["markets_reply"] = ChatJob(
                 model=selected_model,
-                messages=[
-                    {"role": "user", "content": PLOT_CONTEXT_PROMPT + f"Input: {df1} {df2}"}
-                ],
-                options={"temperature": 0.0},
+                prompt=PLOT_CONTEXT_PROMPT + f"Input: News per day:\n{counts}\nMean score per day:\n{scores}",
             )
-            content = resp.get("message", {}).get("content", "")
-            st.write(content)
+        show_reply("markets_reply")
 
 prompt = st.chat_input("Would you like to discuss something?")
 if prompt:
+    st.session_state["chat_reply"] = ChatJob(model=selected_model, prompt=UI_CONTEXT_PROMPT + f"Input: {prompt}")
+if "chat_reply" in st.session_state:
     cont = st.container(border=True)
     with cont:
-        resp = ollama.chat(
-            model=selected_model,
-            messages=[
-                {"role": "user", "content": UI_CONTEXT_PROMPT + f"Input: {prompt}"}
-            ],
-            options={"temperature": 0.0},
-        )
-        content = resp.get("message", {}).get("content", "")
-        st.write(content)
+        show_reply("chat_reply")
 
-for region, items in zip(selected_regions, total_items):
+order_by = {"Relevance": "rank", "Score": "score", "Date": "date"}[sort_by]
+page_size = ITEMS_TABLE_PAGE_SIZE if layout == "Table" else ITEMS_PAGE_SIZE
+# Cards page over stories, so every page shows page_size of them with their duplicates underneath.
+collapse = collapse_stories and layout == "Cards"
+for region in selected_regions:
     st.header(region)
-    if not items:
+    page_filters = (region, start_date, end_date, query_key[3], search_query)
+    n_items = load_count(*page_filters, collapse=collapse, generation=generation)
+    if not n_items:
         st.write("No items found.")
         continue
-    if sort_by == "Score":
-        items = sorted(items, key=lambda x: x.get('score'), reverse=True)
-    elif sort_by == "Date":
-        items = sorted(items, key=lambda x: x.get('date', DEFAULT_START_DATE), reverse=True)
+    # Only the requested page is read from the database, so rendering cost does not grow with the archive.
+    n_pages = math.ceil(n_items / page_size)
+    page = 1
+    if n_pages > 1:
+        page_key = f"page-{region}"
+        if st.session_state.get(page_key, 1) > n_pages:
+            st.session_state[page_key] = n_pages
+        page = st.number_input(label="Page", min_value=1, max_value=n_pages, key=page_key)
+    offset = (page - 1) * page_size
+    items = load_page(*page_filters, order_by=order_by, limit=page_size, offset=offset, collapse=collapse,
+                      generation=generation)
+
+    if layout == "Table":
+        st.caption(f"Items {offset + 1}-{offset + len(items)} of {n_items}")
+        table = pd.DataFrame({
+            "Date": [item.get('date') for item in items],
+            "Source": [item.get('source') for item in items],
+            "Title": [item.get('title') for item in items],
+            "Markets": [", ".join(market for market in MARKETS if item[market]) for item in items],
+            "Score": [item.get('score') for item in items],
+            "Summary": [item.get('summary') for item in items],
+            "Link": [item.get('link') for item in items],
+        })
+        st.dataframe(
+            table,
+            hide_index=True,
+            width="stretch",
+            column_config={"Link": st.column_config.LinkColumn("Link", display_text="Open")},
+        )
+        continue
+
+    duplicates = {}
+    if collapse:
+        stories = {}
+        for item in items:
+            stories.setdefault(item.get('cluster') or item.get('uid'), []).append(item)
+        items = [story[0] for story in stories.values()]
+        duplicates = {id(story[0]): story[1:] for story in stories.values()}
+    st.caption(f"{'Stories' if collapse else 'Items'} {offset + 1}-{offset + len(items)} of {n_items}")
     for item in items:
         cont = st.container(border=True)
         with cont:
@@ -181,6 +382,11 @@ for region, items in zip(selected_regions, total_items):
 
             if summary := item.get('summary'):
                 st.write(summary)
+            if others := duplicates.get(id(item)):
+                st.caption("Also reported by: " + " · ".join(
+                    f"[{other.get('source')}]({other.get('link')})" if other.get('link') else f"{other.get('source')}"
+                    for other in others
+                ))
             if reasons := item.get('reasons'):
                 with st.expander("More info"):
-                    st.write("\n".join(f"- {r}" for r in eval(reasons)))
\ No newline at end of file
+                    st.write("\n".join(f"- {r}" for r in json.loads(reasons)))
\ No newline at end of file
@@ -0,0 +1,209 @@
+import argparse
+import copy
+import datetime as dt
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.servers import FakeOllama, FeedServer, make_rss
+from benchmarks.synthetic import fill_database, synthetic_items
+from settings import MARKETS, REGIONS
+
+
+def measure(stage: str, fn: Callable[[], object], repeat: int, items_per_call: int = 1) -> Dict:
+    # Timings and memory come from separate runs: tracemalloc slows allocation-heavy
+    # code down enough to distort the latency figures.
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "stage": stage,
+        "calls": repeat,
+        "items_per_call": items_per_call,
+        "throughput_per_s": round(items_per_call * repeat / max(sum(latencies), 1e-9), 2),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        "peak_memory_mb": round(peak / 2 ** 20, 3),
+    }
+
+
+def point_regions_at(feed_url: str) -> Dict:
+    original = copy.deepcopy(REGIONS)
+    for conf in REGIONS.values():
+        for src in conf["sources"]:
+            src["url"] = f"{feed_url}/{src['name'].replace(' ', '-')}.xml"
+            src["type"] = "rss"
+    return original
+
+
+def run(args: argparse.Namespace) -> Dict:
+    # The ollama client reads OLLAMA_HOST when it is imported, so the fake server has to be
+    # up before anything from src is imported.
+    with FakeOllama(delay=args.llm_delay) as ollama_server, \
+            FeedServer(items_per_feed=args.feed_items, latency=args.feed_latency) as feed_server:
+        os.environ["OLLAMA_HOST"] = ollama_server.url
+        import pytz
+        from src.db_manager import DBManager
+        from src.news_fetcher import NewsFetcher
+
+        results: List[Dict] = []
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "bench.db")
+            db_manager = DBManager(db_path)
+            db_manager.init()
+            fetcher = NewsFetcher(time_out=10, utc=pytz.UTC)
+
+            feed = make_rss("bench", args.feed_items)
+            entries = fetcher.parse_rss(feed)
+            html = "".join(f"<p>{e['summary_html']}</p>" for e in entries)
+            articles = [{"title": e["title"], "summary": fetcher.clean_html(e["summary_html"])} for e in entries]
+
+            results.append(measure(
+                "clean_html", lambda: [fetcher.clean_html(html) for _ in range(10)], args.repeat, 10,
+            ))
+            results.append(measure(
+                "parse_rss", lambda: fetcher.parse_rss(feed), args.repeat, len(entries),
+            ))
+            results.append(measure(
+                "fetch_rss", lambda: fetcher.fetch_rss(f"{feed_server.url}/bench.xml"), args.repeat, len(entries),
+            ))
+            results.append(measure(
+                "heuristic_relevance",
+                lambda: fetcher.rules.assess_batch([(a["title"], a["summary"]) for a in articles]),
+                args.repeat,
+                len(articles),
+            ))
+            results.append(measure(
+                "extract_with_llm",
+                lambda: fetcher.extract_with_llm(model="bench", title=articles[0]["title"],
+                                                 summary=articles[0]["summary"], markets=MARKETS),
+                args.repeat,
+            ))
+            results.append(measure(
+                "analyse_items",
+                lambda: fetcher.analyse_items(articles=articles, use_llm=True, model="bench"),
+                max(1, args.repeat // 5),
+                len(articles),
+            ))
+
+            original = point_regions_at(feed_server.url)
+            try:
+                results.append(measure(
+                    "fetch_all",
+                    lambda: fetcher.fetch_all(end_date=dt.date(2025, 11, 20), start_date=dt.date(2025, 1, 1),
+                                              use_llm=False),
+                    max(1, args.repeat // 5),
+                    sum(len(conf["sources"]) for conf in REGIONS.values()),
+                ))
+            finally:
+                REGIONS.clear()
+                REGIONS.update(original)
+
+            start = time.perf_counter()
+            fill_database(db_path, n_rows=args.rows, days=args.days, seed=args.seed)
+            fill_seconds = time.perf_counter() - start
+            results.append({
+                "stage": "fill_database",
+                "calls": 1,
+                "items_per_call": args.rows,
+                "throughput_per_s": round(args.rows / max(fill_seconds, 1e-9), 2),
+                "p50_ms": round(fill_seconds * 1000, 3),
+                "p95_ms": round(fill_seconds * 1000, 3),
+                "peak_memory_mb": None,
+            })
+
+            batch = list(synthetic_items(n_rows=args.update_batch, days=args.days, seed=args.seed + 1))
+            results.append(measure(
+                "db_update", lambda: db_manager.update(batch), args.repeat, len(batch),
+            ))
+
+            # Entries that are already stored should be dropped for the price of a uid lookup.
+            known_fetcher = NewsFetcher(time_out=10, utc=pytz.UTC, db_manager=db_manager)
+            window = dict(region="bench", src={"name": "bench"}, start_date=dt.date(2025, 1, 1),
+                          end_date=dt.date(2025, 12, 31))
+            db_manager.update([
+                {**it, "summary": "", "region": "bench", "source": "bench",
+                 "date": it["date_dt"].strftime("%Y-%m-%d")}
+                for it in known_fetcher.select_candidates(fetched=fetcher.parse_rss(feed), **window)
+            ])
+            known_entries = fetcher.parse_rss(feed)
+            results.append(measure(
+                "select_candidates_known",
+                lambda: known_fetcher.select_candidates(fetched=known_entries, **window),
+                args.repeat,
+                len(entries),
+            ))
+
+            regions = list(REGIONS)
+            end_date = dt.date(2025, 11, 20)
+            start_date = end_date - dt.timedelta(days=args.window)
+            filters = dict(region=regions, start_date=start_date, end_date=end_date)
+            n_rows = len(db_manager.get(**filters))
+            results.append(measure(
+                "db_get", lambda: db_manager.get(**filters), args.repeat, n_rows,
+            ))
+            results.append(measure(
+                "db_get_page",
+                lambda: (db_manager.count(**filters), db_manager.get(**filters, order_by="score", limit=25)),
+                args.repeat,
+                25,
+            ))
+            results.append(measure(
+                "db_get_markets", lambda: db_manager.get(**filters, markets_filter=MARKETS[:2]), args.repeat,
+            ))
+            results.append(measure(
+                "chart_aggregations",
+                lambda: (db_manager.daily_region_stats(**filters), db_manager.daily_market_stats(**filters)),
+                args.repeat,
+            ))
+
+        return {
+            "meta": {
+                "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "params": vars(args),
+                "fake_ollama_calls": ollama_server.calls,
+            },
+            "stages": results,
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the fetch, analysis and storage hot paths.")
+    parser.add_argument("--rows", type=int, default=10_000, help="synthetic rows in the benchmark database")
+    parser.add_argument("--days", type=int, default=365, help="days spanned by the synthetic rows")
+    parser.add_argument("--window", type=int, default=30, help="days queried by the read benchmarks")
+    parser.add_argument("--update-batch", type=int, default=500, help="rows per db_update call")
+    parser.add_argument("--feed-items", type=int, default=20, help="items in each generated feed")
+    parser.add_argument("--feed-latency", type=float, default=0.05, help="seconds before each feed response")
+    parser.add_argument("--llm-delay", type=float, default=0.02, help="seconds before each fake LLM response")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = json.dumps(run(args), indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import datetime as dt
+import json
+import random
+import re
+import threading
+import time
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import parse_qs, urlparse
+
+from settings import MARKETS
+
+
+WORDS = [
+    "central", "bank", "policy", "interest", "rate", "inflation", "capital", "regulation", "market", "energy",
+    "technology", "climate", "healthcare", "property", "bond", "yield", "liquidity", "supervision", "stress",
+    "test", "basel", "currency", "intervention", "outlook", "growth", "labour", "consumer", "prices", "credit",
+]
+
+
+def sentence(rng: random.Random, n_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n_words)).capitalize()
+
+
+def make_rss(name: str, n_items: int, seed: int = 0) -> bytes:
+    rng = random.Random(f"{name}-{seed}")
+    now = dt.datetime(2025, 11, 20, 12, tzinfo=dt.timezone.utc)
+    items = []
+    for i in range(n_items):
+        published = format_datetime(now - dt.timedelta(hours=i))
+        summary = "".join(f"<p>{sentence(rng, 20)}.</p>" for _ in range(3))
+        summary = summary.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        items.append(
+            f"<item><title>{sentence(rng, 8)} {i}</title><link>http://example.org/{name}/{i}</link>"
+            f"<description>{summary}</description><pubDate>{published}</pubDate></item>"
+        )
+    return (
+        "<?xml version='1.0' encoding='utf-8'?><rss version='2.0'><channel>"
+        f"<title>{name}</title>{''.join(items)}</channel></rss>"
+    ).encode("utf-8")
+
+
+class _Server:
+
+    def __init__(self, handler) -> None:
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# Serves generated RSS feeds at /<name>.xml with a fixed per-request latency.
+class FeedServer(_Server):
+
+    def __init__(self, items_per_feed: int = 20, latency: float = 0.0) -> None:
+        cache: Dict[str, bytes] = {}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                n_items = int(parse_qs(parsed.query).get("items", [items_per_feed])[0])
+                key = f"{parsed.path}?{n_items}"
+                if key not in cache:
+                    cache[key] = make_rss(parsed.path.strip("/"), n_items)
+                time.sleep(latency)
+                body = cache[key]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/rss+xml")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        super().__init__(Handler)
+
+
+# Answers /api/chat like Ollama after a fixed delay; batch prompts get a JSON array back.
+class FakeOllama(_Server):
+
+    def __init__(self, delay: float = 0.0, seed: int = 0) -> None:
+        rng = random.Random(seed)
+        lock = threading.Lock()
+        self.calls = 0
+        server = self
+
+        def assessment() -> Dict:
+            with lock:
+                relevant = rng.random() < 0.6
+                markets = rng.sample(MARKETS, rng.randint(1, 2)) if relevant else []
+                score = rng.randint(1, 5) if relevant else 0
+            return {
+                "relevant": relevant,
+                "markets": markets,
+                "score": score,
+                "summary": "Synthetic assessment." if relevant else "",
+                "reasons": ["Synthetic reason."] if relevant else [],
+            }
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with lock:
+                    server.calls += 1
+                time.sleep(delay)
+                prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+                n_batch = len(re.findall(r"^\d+\. TITLE=", prompt, re.M))
+                if n_batch:
+                    content = json.dumps([{"id": i, **assessment()} for i in range(n_batch)])
+                else:
+                    content = json.dumps(assessment())
+                out = json.dumps({
+                    "model": body.get("model"),
+                    "created_at": "2025-11-20T12:00:00Z",
+                    "message": {"role": "assistant", "content": content},
+                    "done": True,
+                    "prompt_eval_count": len(prompt.split()),
+                    "eval_count": len(content.split()),
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        super().__init__(Handler)
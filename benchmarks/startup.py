@@ -0,0 +1,131 @@
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.synthetic import fill_database
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependencies that only the ingestion and the LLM paths should load.
+HEAVY_MODULES = ["ollama", "feedparser", "bs4", "httpx"]
+
+IMPORTS = {
+    "import_src": "import src",
+    "import_dashboard": (
+        "import pandas, streamlit\n"
+        "from src import UI_CONTEXT_PROMPT, DBManager, LLMCache, NewsFetcher, PLOT_CONTEXT_PROMPT, METRICS, "
+        "Metrics, StoryClusterer, ChatJob, compact_table"
+    ),
+    "import_ingest": "import src.ingest",
+}
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+{code}
+seconds = time.perf_counter() - start
+loaded = sorted({{name.split(".")[0] for name in sys.modules}} & set({heavy!r}))
+print(json.dumps({{"seconds": seconds, "heavy_modules": loaded}}))
+"""
+
+# The app reads settings.DB_PATH when it runs, so pointing it at the synthetic database
+# before the first run keeps news_info.db untouched.
+APP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+import settings
+settings.DB_PATH = {db_path!r}
+at = AppTest.from_file("app.py", default_timeout=300)
+at.run()
+first_run = time.perf_counter() - start
+start = time.perf_counter()
+at.run()
+rerun = time.perf_counter() - start
+loaded = sorted({{name.split(".")[0] for name in sys.modules}} & set({heavy!r}))
+print(json.dumps({{
+    "first_run": first_run, "rerun": rerun, "exceptions": len(at.exception), "heavy_modules": loaded,
+}}))
+"""
+
+
+def run_script(script: str) -> Dict:
+    # Every sample is a fresh interpreter, so module caches never turn a cold start into a warm one.
+    out = subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def summarise(stage: str, seconds: List[float], **extra) -> Dict:
+    latencies_ms = np.array(seconds) * 1000
+    return {
+        "stage": stage,
+        "calls": len(seconds),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        **extra,
+    }
+
+
+def run(args: argparse.Namespace) -> Dict:
+    results: List[Dict] = []
+    for stage, code in IMPORTS.items():
+        samples = [run_script(IMPORT_SCRIPT.format(code=code, heavy=HEAVY_MODULES)) for _ in range(args.repeat)]
+        results.append(summarise(
+            stage, [s["seconds"] for s in samples], heavy_modules=samples[-1]["heavy_modules"],
+        ))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        fill_database(db_path, n_rows=args.rows, days=args.days, seed=args.seed)
+        samples = [
+            run_script(APP_SCRIPT.format(db_path=db_path, heavy=HEAVY_MODULES)) for _ in range(args.app_repeat)
+        ]
+    heavy = samples[-1]["heavy_modules"]
+    exceptions = sum(s["exceptions"] for s in samples)
+    results.append(summarise(
+        "app_first_run", [s["first_run"] for s in samples], heavy_modules=heavy, exceptions=exceptions,
+    ))
+    results.append(summarise("app_rerun", [s["rerun"] for s in samples]))
+
+    return {
+        "meta": {
+            "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "params": vars(args),
+        },
+        "stages": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark import time and the dashboard's first and later runs.")
+    parser.add_argument("--rows", type=int, default=10_000, help="synthetic rows in the dashboard database")
+    parser.add_argument("--days", type=int, default=365, help="days spanned by the synthetic rows")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per import stage")
+    parser.add_argument("--app-repeat", type=int, default=3, help="fresh interpreters running the app")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = json.dumps(run(args), indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
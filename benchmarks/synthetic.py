@@ -0,0 +1,62 @@
+import argparse
+import datetime as dt
+import random
+from typing import Dict, Iterator, List
+
+from settings import MARKETS, REGIONS
+from benchmarks.servers import sentence
+
+
+def synthetic_items(n_rows: int, days: int = 365, seed: int = 0) -> Iterator[Dict]:
+    rng = random.Random(seed)
+    end = dt.date(2025, 11, 20)
+    regions = list(REGIONS)
+    for i in range(n_rows):
+        region = rng.choice(regions)
+        source = rng.choice(REGIONS[region]["sources"])["name"]
+        day = end - dt.timedelta(days=rng.randrange(days))
+        relevant_markets = rng.sample(MARKETS, rng.randint(0, 3))
+        yield {
+            "title": f"{sentence(rng, 10)} #{i}",
+            "markets": relevant_markets,
+            "score": rng.randint(1, 5) if relevant_markets else 0,
+            "summary": f"{sentence(rng, 30)}.",
+            "reasons": [f"{sentence(rng, 12)}." for _ in range(2)],
+            "link": f"http://example.org/{i}",
+            "date": day.strftime("%Y-%m-%d"),
+            "time": f"{rng.randrange(24):02d}-{rng.randrange(60):02d}-00",
+            "region": region,
+            "zone": REGIONS[region]["zone"],
+            "source": source,
+        }
+
+
+def fill_database(db_path: str, n_rows: int, days: int = 365, seed: int = 0, chunk_size: int = 5000) -> int:
+    from src.db_manager import DBManager
+
+    db_manager = DBManager(db_path)
+    db_manager.init()
+    inserted = 0
+    chunk: List[Dict] = []
+    for item in synthetic_items(n_rows=n_rows, days=days, seed=seed):
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            inserted += db_manager.update(chunk)[0]
+            chunk = []
+    if chunk:
+        inserted += db_manager.update(chunk)[0]
+    return inserted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fill a news database with synthetic rows.")
+    parser.add_argument("--db", required=True)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(fill_database(args.db, n_rows=args.rows, days=args.days, seed=args.seed))
+
+
+if __name__ == "__main__":
+    main()
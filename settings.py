@@ -22,7 +22,11 @@ REGIONS = {
             {
                 "name": "FX Street",
                 "url": "https://about.fxstreet.com/press-releases/",
-                "type": "rss",
+                "type": "html-list",
+                "item": "article",
+                "title": "h2, h3",
+                "link": "a[href]",
+                "date": "time",
             },
         ],
     },
@@ -116,6 +120,68 @@ MARKETS = [
     "Real Estate",
 ]
 
+# Terms ending in "*" match any word starting with them; the others match whole words, plural included.
+RELEVANCE_TERMS = {
+    "regulat*": 3,
+    "central bank": 3,
+    "monetary policy": 3,
+    "interest rate": 3,
+    "capital requirement": 3,
+    "basel": 3,
+    "inflation": 2,
+    "supervis*": 2,
+    "legislat*": 2,
+    "sanction*": 2,
+    "tariff*": 2,
+    "subsidy": 2,
+    "subsidies": 2,
+    "subsidised": 2,
+    "subsidized": 2,
+    "stress test": 2,
+    "financial stability": 2,
+    "policy": 1,
+    "policies": 1,
+    "bank": 1,
+    "banking": 1,
+    "banker": 1,
+    "capital": 1,
+    "invest": 1,
+    "investing": 1,
+    "investment": 1,
+    "investor": 1,
+    "tax": 1,
+    "taxes": 1,
+    "taxation": 1,
+    "directive": 1,
+    "rule": 1,
+}
+
+MARKET_LEXICONS = {
+    "Energy": [
+        "energy", "oil", "crude", "natural gas", "lng", "opec", "petroleum", "refiner*", "electricity",
+        "power grid", "renewable*", "solar", "wind power", "nuclear", "coal",
+    ],
+    "Technology": [
+        "technolog*", "tech", "software", "semiconductor*", "chip", "artificial intelligence", "ai", "cyber*",
+        "digital", "cloud computing", "telecom*", "data protection", "crypto*",
+    ],
+    "Climate Change": [
+        "climate", "emission*", "carbon", "net zero", "greenhouse", "esg", "sustainab*", "green bond",
+        "decarboni*", "paris agreement", "biodiversity",
+    ],
+    "Healthcare": [
+        "health*", "pharma*", "drug", "medic*", "hospital", "vaccin*", "biotech*", "fda", "clinical trial",
+    ],
+    "Real Estate": [
+        "real estate", "property", "properties", "housing", "mortgage", "house price", "home price", "reit",
+        "commercial property", "construction",
+    ],
+}
+
+HEURISTIC_MARKET_WEIGHT = 1
+
+HEURISTIC_POINTS_PER_SCORE = 3
+
 AVAILABLE_MODELS = [
     "llama3.1:8b",
     "llama3.2:1b",
@@ -127,4 +193,75 @@ DEFAULT_START_DATE = dt.date(2025, 11, 10)
 
 DB_PATH = "news_info.db"
 
-HTTP_TIMEOUT = 10
\ No newline at end of file
+SNAPSHOT_DIR = "snapshots/news"
+
+HTTP_TIMEOUT = 10
+
+HTTP_MAX_CONNECTIONS = 32
+
+HTTP_MAX_KEEPALIVE = 16
+
+FETCH_MAX_WORKERS = 8
+
+FETCH_MAX_PER_HOST = 2
+
+FETCH_BACKFILL_MAX_PAGES = 20
+
+LLM_CACHE_MAX_ENTRIES = 50000
+
+LLM_CACHE_MAX_AGE_DAYS = 90
+
+LLM_BATCH_SIZE = 5
+
+LLM_PARALLELISM = 2
+
+# Cheaper tiers screen the items before the chosen model and only the ones they pass are escalated.
+# "heuristic" is the rule-based classifier; any other entry is an Ollama model asked for a yes/no verdict.
+TRIAGE_TIERS = ["heuristic"]
+
+TRIAGE_MIN_POINTS = 1
+
+TRIAGE_BATCH_SIZE = 20
+
+PIPELINE_COMMIT_EVERY = 20
+
+# Near-duplicate stories are grouped with this Ollama embedding model (e.g. "nomic-embed-text"),
+# or with SimHash when it is None or unavailable.
+CLUSTER_EMBED_MODEL = None
+
+CLUSTER_SIMILARITY = 0.9
+
+# SimHash similarity is 1 - 2 * hamming / 64; unrelated texts sit around 0 with a spread of 0.125.
+CLUSTER_SIMHASH_SIMILARITY = 0.75
+
+CLUSTER_WINDOW_DAYS = 7
+
+INGEST_INTERVAL = 1800
+
+INGEST_JITTER = 120
+
+INGEST_MAX_BACKOFF = 6 * 3600
+
+INGEST_USE_LLM = True
+
+INGEST_MODEL = "llama3.2:1b"
+
+QUEUE_LEASE_SECONDS = 600
+
+QUEUE_MAX_ATTEMPTS = 5
+
+QUEUE_RETRY_DELAY = 30
+
+QUEUE_POLL_INTERVAL = 1.0
+
+DASHBOARD_READ_ONLY = True
+
+ITEMS_PAGE_SIZE = 25
+
+ITEMS_TABLE_PAGE_SIZE = 500
+
+PROMPT_MAX_ROWS = 60
+
+CHAT_MAX_WORKERS = 2
+
+CHAT_POLL_INTERVAL = 0.5
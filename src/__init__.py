@@ -1,3 +1,36 @@
-from .db_manager import DBManager
-from .context_prompts import ANALYSIS_CONTEXT_PROMPT, UI_CONTEXT_PROMPT, PLOT_CONTEXT_PROMPT
-from .news_fetcher import NewsFetcher
\ No newline at end of file
+import importlib
+
+
+_EXPORTS = {
+    "DBManager": "db_manager",
+    "ANALYSIS_CONTEXT_PROMPT": "context_prompts",
+    "BATCH_ANALYSIS_CONTEXT_PROMPT": "context_prompts",
+    "TRIAGE_CONTEXT_PROMPT": "context_prompts",
+    "UI_CONTEXT_PROMPT": "context_prompts",
+    "PLOT_CONTEXT_PROMPT": "context_prompts",
+    "NewsFetcher": "news_fetcher",
+    "LLMCache": "llm_cache",
+    "RelevanceRules": "relevance",
+    "StoryClusterer": "clustering",
+    "METRICS": "metrics",
+    "Metrics": "metrics",
+    "ChatJob": "assistant",
+    "compact_table": "assistant",
+    "WorkQueue": "work_queue",
+}
+
+__all__ = list(_EXPORTS)
+
+
+# Exports are imported from their module on first use, so the dashboard only loads what a
+# session actually touches and `import src` stays cheap.
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted({*globals(), *__all__})
@@ -0,0 +1,78 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import pandas as pd
+
+from settings import CHAT_MAX_WORKERS, PROMPT_MAX_ROWS
+from src.metrics import METRICS
+
+
+EXECUTOR = ThreadPoolExecutor(max_workers=CHAT_MAX_WORKERS, thread_name_prefix="chat")
+
+
+def compact_table(
+        df: pd.DataFrame,
+        index: str,
+        columns: str,
+        values: str,
+        aggfunc: str = "sum",
+        fill_value: Optional[float] = None,
+        max_rows: int = PROMPT_MAX_ROWS,
+    ) -> str:
+    # The series is pivoted to one row per day and, when that is still too long, resampled to
+    # weeks, months, quarters and years until it fits, so the prompt has a bounded size
+    # whatever the selected period.
+    if df.empty:
+        return "(no data)"
+    daily = df.pivot_table(index=index, columns=columns, values=values, aggfunc=aggfunc, fill_value=fill_value)
+    daily.index = pd.to_datetime(daily.index)
+    table = daily
+    for freq in ("W", "MS", "QS", "YS"):
+        if len(table) <= max_rows:
+            break
+        table = daily.resample(freq).agg(aggfunc)
+    return table.tail(max_rows).round(2).to_csv(date_format="%Y-%m-%d", float_format="%g")
+
+
+class ChatJob:
+
+    def __init__(self, model: str, prompt: str) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.model = model
+        self.prompt = prompt
+        self._chunks: List[str] = []
+        self._lock = threading.Lock()
+        self.done = False
+        self.error: Optional[str] = None
+        self.future = EXECUTOR.submit(self._run)
+
+
+    def _run(self) -> None:
+        import ollama
+
+        try:
+            with METRICS.timer("llm", model=self.model, mode="chat"):
+                for part in ollama.chat(
+                        model=self.model,
+                        messages=[
+                            {"role": "user", "content": self.prompt}
+                        ],
+                        options={"temperature": 0.0},
+                        stream=True,
+                    ):
+                    with self._lock:
+                        self._chunks.append(part.get("message", {}).get("content", ""))
+            METRICS.count("llm_calls", model=self.model, mode="chat")
+        except Exception as e:
+            self.logger.exception(f"Chat with {self.model} failed: {e}")
+            self.error = str(e)
+        finally:
+            self.done = True
+
+
+    @property
+    def text(self) -> str:
+        with self._lock:
+            return "".join(self._chunks)
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from settings import CLUSTER_EMBED_MODEL, CLUSTER_SIMILARITY, CLUSTER_SIMHASH_SIMILARITY, CLUSTER_WINDOW_DAYS
+from src.metrics import METRICS
+
+
+WORD = re.compile(r"\w{2,}|\d")
+
+
+class StoryClusterer:
+
+    def __init__(
+            self,
+            db_path: str,
+            embed_model: Optional[str] = CLUSTER_EMBED_MODEL,
+            similarity: float = CLUSTER_SIMILARITY,
+            simhash_similarity: float = CLUSTER_SIMHASH_SIMILARITY,
+            window_days: int = CLUSTER_WINDOW_DAYS,
+        ) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        self.embed_model = embed_model
+        self.similarity = similarity
+        self.simhash_similarity = simhash_similarity
+        self.window_days = window_days
+        self._index: Dict[str, Dict] = {}
+        self._assessments: Dict[Tuple[str, str], Tuple[Dict, str]] = {}
+
+
+    def init(self) -> None:
+        with sqlite3.connect(self.db_path) as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS news_vectors (
+                    uid TEXT PRIMARY KEY,
+                    cluster TEXT,
+                    method TEXT,
+                    vector BLOB,
+                    assessment TEXT,
+                    nlp_method TEXT,
+                    created_at REAL
+                )
+                """
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_news_vectors_created ON news_vectors(method, created_at)")
+            # A story's verdict is kept per analysis (the LLM model, or "heuristic"), like the
+            # keys of LLMCache, so a heuristic run never answers for a later LLM run.
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS story_assessments (
+                    cluster TEXT,
+                    analysis TEXT,
+                    assessment TEXT,
+                    nlp_method TEXT,
+                    created_at REAL,
+                    PRIMARY KEY (cluster, analysis)
+                )
+                """
+            )
+            # Verdicts stored with the vectors did not record the analysis; only the LLM ones
+            # can be told apart, since a heuristic verdict may have been an LLM fallback.
+            con.execute(
+                """
+                INSERT OR IGNORE INTO story_assessments (cluster, analysis, assessment, nlp_method, created_at)
+                SELECT cluster, nlp_method, assessment, nlp_method, created_at FROM news_vectors
+                WHERE assessment IS NOT NULL AND nlp_method NOT IN ('heuristic', 'triage')
+                """
+            )
+            con.execute("UPDATE news_vectors SET assessment = NULL, nlp_method = NULL WHERE assessment IS NOT NULL")
+
+
+    def load(self) -> None:
+        # Only the recent window is kept, on disk and in memory: a story that is still being
+        # reported is at most a few days old, and the matrix stays small enough to scan in full.
+        cutoff = time.time() - self.window_days * 86400
+        with sqlite3.connect(self.db_path) as con:
+            con.execute("DELETE FROM news_vectors WHERE created_at < ?", (cutoff,))
+            con.execute("DELETE FROM story_assessments WHERE created_at < ?", (cutoff,))
+            rows = con.execute("SELECT cluster, method, vector FROM news_vectors ORDER BY created_at").fetchall()
+            assessments = con.execute(
+                "SELECT cluster, analysis, assessment, nlp_method FROM story_assessments"
+            ).fetchall()
+        self._index = {}
+        vectors: Dict[str, List[np.ndarray]] = {}
+        for cluster, method, vector in rows:
+            self._entry(method)["clusters"].append(cluster)
+            vectors.setdefault(method, []).append(np.frombuffer(vector, dtype=np.float32))
+        self._assessments = {
+            (cluster, analysis): (json.loads(assessment), nlp_method)
+            for cluster, analysis, assessment, nlp_method in assessments
+        }
+        for method, method_vectors in vectors.items():
+            self._entry(method)["matrix"] = np.stack(method_vectors)
+
+
+    def _entry(self, method: str) -> Dict:
+        return self._index.setdefault(method, {"clusters": [], "matrix": None})
+
+
+    @staticmethod
+    def text(item: Dict) -> str:
+        return f"{item.get('title') or ''} {item.get('summary_raw') or ''}"
+
+
+    @staticmethod
+    def simhash(text: str) -> np.ndarray:
+        # 64-bit SimHash over words and word pairs, returned as a unit +-1 vector so that cosine
+        # similarity is 1 - 2 * hamming / 64 and both methods share the same index code.
+        words = WORD.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        if not features:
+            return np.zeros(64, dtype=np.float32)
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "little") for f in features],
+            dtype=np.uint64,
+        )
+        bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+        signs = np.where(bits.sum(axis=0) * 2 >= len(features), 1.0, -1.0)
+        return (signs / 8.0).astype(np.float32)
+
+
+    def embed(self, texts: List[str]) -> Tuple[str, np.ndarray]:
+        if self.embed_model:
+            import ollama
+
+            try:
+                with METRICS.timer("embed", model=self.embed_model):
+                    resp = ollama.embed(model=self.embed_model, input=texts)
+                vectors = np.array(resp["embeddings"], dtype=np.float32)
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                return self.embed_model, vectors / np.where(norms == 0, 1, norms)
+            except Exception as e:
+                self.logger.warning(f"Embedding with {self.embed_model} failed, falling back to SimHash: {e}")
+        return "simhash", np.stack([self.simhash(text) for text in texts])
+
+
+    def assign(self, items: List[Dict], analysis: str) -> Dict[str, Tuple[Dict, str]]:
+        # Every item joins the most similar story seen in the window, or among the earlier items
+        # of this batch, when it clears the threshold; otherwise it starts a story named after
+        # its own uid. Returns the assessments the given analysis stored for the joined stories.
+        if not items:
+            return {}
+        method, vectors = self.embed([self.text(it) for it in items])
+        entry = self._entry(method)
+        threshold = self.simhash_similarity if method == "simhash" else self.similarity
+        if entry["matrix"] is None or entry["matrix"].shape[1:] != vectors.shape[1:]:
+            # A new embedding model (or a changed one) starts an empty index of its own width.
+            entry["matrix"] = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            entry["clusters"] = []
+        clusters = list(entry["clusters"])
+        stored = vectors @ entry["matrix"].T
+        for i, it in enumerate(items):
+            similarities = np.concatenate([stored[i], vectors[:i] @ vectors[i]])
+            best = int(np.argmax(similarities)) if len(similarities) else -1
+            if best >= 0 and similarities[best] >= threshold and np.any(vectors[i]):
+                it["cluster"] = clusters[best]
+            else:
+                it["cluster"] = it["uid"]
+            it["vector"] = (method, vectors[i])
+            clusters.append(it["cluster"])
+        return {
+            cluster: self._assessments[cluster, analysis]
+            for cluster in {it["cluster"] for it in items} if (cluster, analysis) in self._assessments
+        }
+
+
+    def add(self, items: List[Dict], assessments: Dict[str, Tuple[Dict, str]], analysis: str) -> None:
+        now = time.time()
+        rows = []
+        added: Dict[str, List[np.ndarray]] = {}
+        for it in items:
+            method, vector = it.pop("vector")
+            self._entry(method)["clusters"].append(it["cluster"])
+            added.setdefault(method, []).append(vector)
+            rows.append((it["uid"], it["cluster"], method, vector.tobytes(), now))
+        for cluster, assessment in assessments.items():
+            self._assessments[cluster, analysis] = assessment
+        for method, vectors in added.items():
+            entry = self._entry(method)
+            entry["matrix"] = np.vstack([entry["matrix"], np.stack(vectors)])
+        with sqlite3.connect(self.db_path) as con:
+            con.executemany(
+                "INSERT OR REPLACE INTO news_vectors (uid, cluster, method, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            con.executemany(
+                """
+                INSERT OR REPLACE INTO story_assessments (cluster, analysis, assessment, nlp_method, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                [(cluster, analysis, json.dumps(assess), nlp_method, now)
+                 for cluster, (assess, nlp_method) in assessments.items()],
+            )
@@ -22,3 +22,27 @@ PLOT_CONTEXT_PROMPT = (
     the trend offering a global overview of the result. Reply with only a couple of sentences."
     """
 )
+BATCH_ANALYSIS_CONTEXT_PROMPT = (
+    """
+    You are an analyst for Norges Bank Investment Management. You will receive a numbered list of news. For each news, 
+    assess if it is related and relevant to any of the specified markets. If and only if relevant, identify the markets 
+    which could be affected, give a score (from 1-5, where 5 indicates the highest impact, and 1 the low but still 
+    significant impact) and provide a 2-3 sentence summary focusing on regulatory/central bank policy impact. Your 
+    output is a strict JSON array with one object per news, in the same order, each with keys: id (the number of the 
+    news), relevant (true/false), markets (array of strings), score (int), summary (string), reasons (array of strings). 
+    An example of output is: '[{\"id\": 0, \"relevant\": true, \"markets\": [\"Market 1\"], \"score\": 5, 
+    \"summary\": \"Whatever\", \"reasons\": [\"Reason 1\"]}, {\"id\": 1, \"relevant\": false, \"markets\": [], 
+    \"score\": 0, \"summary\": \"\", \"reasons\": []}]'. 
+    Avoid any extra characters besides the JSON."
+    """
+)
+TRIAGE_CONTEXT_PROMPT = (
+    """
+    You are screening news for Norges Bank Investment Management. You will receive a numbered list of news. For each 
+    news, decide only if it could be related and relevant to any of the specified markets through regulation, central 
+    bank policy or government policy. Your output is a strict JSON array with one object per news, in the same order, 
+    each with keys: id (the number of the news) and relevant (true/false). An example of output is: 
+    '[{\"id\": 0, \"relevant\": true}, {\"id\": 1, \"relevant\": false}]'. 
+    Avoid any extra characters besides the JSON."
+    """
+)
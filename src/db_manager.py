@@ -1,16 +1,42 @@
+import ast
+import hashlib
+import json
 import os
+import re
 import sqlite3
-from typing import List, Dict, Iterable, Optional
+import threading
+from typing import List, Dict, Iterable, Optional, Set, Tuple, Union
 from datetime import date
-import pandas as pd
 import datetime as dt
+import pandas as pd
 
 from settings import MARKETS, DEFAULT_START_DATE
+from src.metrics import METRICS
+from src.snapshot import read_snapshot
+
+
+NEWS_COLUMNS = [
+    "uid", "title", "link", "date", "time", "region", "zone", "source", *MARKETS, "reasons", "score", "summary",
+    "cluster",
+]
+
+# Undated rows sort as DEFAULT_START_DATE, which is the date they are shown with.
+ORDER_BY = {
+    "id": "id",
+    "score": f"score IS NULL, score DESC, COALESCE(date, '{DEFAULT_START_DATE:%Y-%m-%d}') DESC, time DESC, id DESC",
+    "date": f"COALESCE(date, '{DEFAULT_START_DATE:%Y-%m-%d}') DESC, time DESC, id DESC",
+}
+
+# Rows of the same story share a cluster; a row without one is a story of its own.
+STORY_KEY = "COALESCE(cluster, uid)"
 
 
 class DBManager:
-    def __init__(self, db_path: str) -> None:
+    def __init__(self, db_path: str, snapshot_dir: Optional[str] = None) -> None:
         self.db_path = db_path
+        self.snapshot_dir = snapshot_dir
+        self._uid_index: Optional[Set[int]] = None
+        self._uid_index_lock = threading.Lock()
 
     def init(self) -> None:
         if (not os.path.exists(self.db_path)) or (os.path.getsize(self.db_path) == 0):
@@ -30,57 +56,715 @@ class DBManager:
                     "score": "INTEGER",
                     "summary": "TEXT",
                     "created_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+                    "cluster": "TEXT",
                 }
                 db = pd.DataFrame([], columns=list(dtypes.keys()))
                 db.to_sql("news", con, index=False, dtype=dtypes)
-                cur = con.cursor()
-                cur.execute("CREATE INDEX IF NOT EXISTS idx_news_date ON news(date)")
-                cur.execute("CREATE INDEX IF NOT EXISTS idx_news_region ON news(region)")
-                cur.execute("CREATE INDEX IF NOT EXISTS idx_news_source ON news(source)")
-                con.commit()
+        with sqlite3.connect(self.db_path) as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            cur = con.cursor()
+            columns = {row[1] for row in cur.execute("PRAGMA table_info(news)")}
+            if "cluster" not in columns:
+                cur.execute("ALTER TABLE news ADD COLUMN cluster TEXT")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_news_date ON news(date)")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_news_region ON news(region)")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_news_source ON news(source)")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_news_region_date ON news(region, date)")
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS feed_state (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    modified TEXT,
+                    content_hash TEXT,
+                    checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    high_water_at TEXT,
+                    high_water_uid TEXT
+                )
+                """
+            )
+            feed_columns = {row[1] for row in cur.execute("PRAGMA table_info(feed_state)")}
+            for column in ("high_water_at", "high_water_uid"):
+                if column not in feed_columns:
+                    cur.execute(f"ALTER TABLE feed_state ADD COLUMN {column} TEXT")
+            fts_exists = cur.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'news_fts'"
+            ).fetchone()
+            cur.execute(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5(
+                    title, summary, reasons, content='news', content_rowid='id', tokenize='porter unicode61'
+                )
+                """
+            )
+            cur.executescript(
+                """
+                CREATE TRIGGER IF NOT EXISTS news_fts_ai AFTER INSERT ON news BEGIN
+                    INSERT INTO news_fts(rowid, title, summary, reasons)
+                    VALUES (new.id, new.title, new.summary, new.reasons);
+                END;
+                CREATE TRIGGER IF NOT EXISTS news_fts_ad AFTER DELETE ON news BEGIN
+                    INSERT INTO news_fts(news_fts, rowid, title, summary, reasons)
+                    VALUES ('delete', old.id, old.title, old.summary, old.reasons);
+                END;
+                CREATE TRIGGER IF NOT EXISTS news_fts_au AFTER UPDATE ON news BEGIN
+                    INSERT INTO news_fts(news_fts, rowid, title, summary, reasons)
+                    VALUES ('delete', old.id, old.title, old.summary, old.reasons);
+                    INSERT INTO news_fts(rowid, title, summary, reasons)
+                    VALUES (new.id, new.title, new.summary, new.reasons);
+                END;
+                """
+            )
+            if not fts_exists:
+                cur.execute("INSERT INTO news_fts(news_fts) VALUES ('rebuild')")
+            cur.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS refresh_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    trigger TEXT,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    duration_s REAL,
+                    inserted INTEGER,
+                    updated INTEGER,
+                    failed_sources INTEGER,
+                    stats TEXT
+                )
+                """
+            )
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS news_daily (
+                    day TEXT,
+                    region TEXT,
+                    markets_mask INTEGER,
+                    n INTEGER,
+                    score_sum REAL,
+                    score_n INTEGER,
+                    PRIMARY KEY (day, region, markets_mask)
+                )
+                """
+            )
+            # The rollup encodes market flags as bits in MARKETS order, so it is rebuilt
+            # whenever that list changes.
+            layout = cur.execute("SELECT value FROM meta WHERE key = 'rollup_markets'").fetchone()
+            if layout is None or json.loads(layout[0]) != MARKETS:
+                self._rebuild_rollups(con)
+            if cur.execute("SELECT 1 FROM meta WHERE key = 'reasons_format'").fetchone() is None:
+                self._migrate_reasons(con)
+            con.commit()
+
+
+    def _migrate_reasons(self, con: sqlite3.Connection) -> None:
+        # Reasons used to be written with str(list) and read back with eval; rewrite them as JSON.
+        rows = []
+        for row_id, reasons in con.execute("SELECT id, reasons FROM news WHERE reasons IS NOT NULL"):
+            try:
+                json.loads(reasons)
+                continue
+            except json.JSONDecodeError:
+                pass
+            try:
+                value = ast.literal_eval(reasons)
+            except (ValueError, SyntaxError):
+                value = [reasons]
+            rows.append((json.dumps(value if isinstance(value, list) else [value]), row_id))
+        con.executemany("UPDATE news SET reasons = ? WHERE id = ?", rows)
+        con.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('reasons_format', 'json')")
+
+
+    def get_feed_states(self) -> Dict[str, Dict]:
+        with sqlite3.connect(self.db_path) as con:
+            con.row_factory = sqlite3.Row
+            rows = con.execute(
+                "SELECT url, etag, modified, content_hash, high_water_at, high_water_uid FROM feed_state"
+            ).fetchall()
+        return {row["url"]: dict(row) for row in rows}
+
+
+    def set_feed_states(self, states: Dict[str, Dict]) -> None:
+        if not states:
+            return
+        rows = [
+            (
+                url, state.get("etag"), state.get("modified"), state.get("content_hash"),
+                state.get("high_water_at"), state.get("high_water_uid"),
+            )
+            for url, state in states.items()
+        ]
+        # The high-water mark only moves forward: a run that saw nothing newer (or a backfill
+        # through older pages) keeps the mark that is stored.
+        with sqlite3.connect(self.db_path) as con:
+            con.executemany(
+                """
+                INSERT INTO feed_state (url, etag, modified, content_hash, checked_at, high_water_at, high_water_uid)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = excluded.etag,
+                    modified = excluded.modified,
+                    content_hash = excluded.content_hash,
+                    checked_at = excluded.checked_at,
+                    high_water_uid = CASE
+                        WHEN feed_state.high_water_at IS NULL OR excluded.high_water_at > feed_state.high_water_at
+                        THEN excluded.high_water_uid ELSE feed_state.high_water_uid END,
+                    high_water_at = CASE
+                        WHEN feed_state.high_water_at IS NULL OR excluded.high_water_at > feed_state.high_water_at
+                        THEN excluded.high_water_at ELSE feed_state.high_water_at END
+                """,
+                rows,
+            )
 
 
-    def _make_uid(self, item: Dict) -> str:
-        title = item.get("title", "")[:120]
+    @staticmethod
+    def _make_uid(item: Dict) -> str:
+        title = (item.get("title") or "")[:120]
         date_str = item.get("date", "")
         source = item.get("source", "")
         region = item.get("region", "")
         return f"{region}|{source}|{date_str}|{title}"
 
 
-    def update(self, items: Iterable[Dict]) -> int:
-        if not items:
-            return 0
+    def _existing_uids(self, con: sqlite3.Connection, uids: Iterable[str]) -> Set[str]:
+        uids = list(set(uids))
+        found = set()
+        for i in range(0, len(uids), 500):
+            chunk = uids[i:i + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = con.execute(f"SELECT uid FROM news WHERE uid IN ({placeholders})", chunk).fetchall()
+            found.update(row[0] for row in rows)
+        return found
+
+
+    @staticmethod
+    def _uid_key(uid: str) -> int:
+        return int.from_bytes(hashlib.blake2b(uid.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+    def _load_uid_index(self) -> Set[int]:
+        with self._uid_index_lock:
+            if self._uid_index is None:
+                with sqlite3.connect(self.db_path) as con:
+                    self._uid_index = {self._uid_key(row[0]) for row in con.execute("SELECT uid FROM news")}
+            return self._uid_index
+
+
+    def existing_uids(self, uids: Iterable[str]) -> Set[str]:
+        # Stored uids are kept in memory as 64-bit digests, loaded once and extended on every
+        # write. Uids missing from the index are still looked up in the table, so rows written
+        # by another process (the ingester, say) are found as well.
+        index = self._load_uid_index()
+        uids = set(uids)
+        found = {uid for uid in uids if self._uid_key(uid) in index}
+        unknown = uids - found
+        if unknown:
+            with sqlite3.connect(self.db_path) as con:
+                stored = self._existing_uids(con, unknown)
+            with self._uid_index_lock:
+                index.update(map(self._uid_key, stored))
+            found |= stored
+        METRICS.count("uid_index_hits", len(uids) - len(unknown))
+        return found
+
+
+    def _to_row(self, item: Dict) -> Tuple:
+        markets = item.get("markets") or []
+        # Models sometimes answer with a single reason instead of a list; store it like the
+        # migration does, so readers can always iterate the decoded value.
+        reasons = item.get("reasons") or []
+        return (
+            self._make_uid(item),
+            *(item.get(column) for column in ("title", "link", "date", "time", "region", "zone", "source")),
+            *(int(market in markets) for market in MARKETS),
+            json.dumps(reasons if isinstance(reasons, list) else [reasons]),
+            item.get("score"),
+            item.get("summary"),
+            item.get("cluster"),
+        )
+
+
+    @METRICS.timed("db_update")
+    def update(self, items: Iterable[Dict], on_conflict: str = "update") -> Tuple[int, int]:
+        if on_conflict not in ("update", "ignore"):
+            raise ValueError(f"on_conflict must be 'update' or 'ignore', got {on_conflict!r}")
+        # Later duplicates in the same batch win, mirroring what ON CONFLICT would do row by row.
+        rows = {row[0]: row for row in map(self._to_row, items or [])}
+        if not rows:
+            return 0, 0
+
+        columns = ", ".join(f'"{column}"' for column in NEWS_COLUMNS)
+        placeholders = ", ".join("?" for _ in NEWS_COLUMNS)
+        if on_conflict == "update":
+            assignments = ", ".join(f'"{column}" = excluded."{column}"' for column in NEWS_COLUMNS[1:])
+            conflict = f"DO UPDATE SET {assignments}"
+        else:
+            conflict = "DO NOTHING"
+
         with sqlite3.connect(self.db_path) as con:
-            db = pd.read_sql_query(f"SELECT * FROM news LIMIT 1", con)
-            new_db = pd.DataFrame(items).drop(columns=["markets"])
-            new_db["uid"] = new_db.apply(self._make_uid, axis=1)
-            new_db["reasons"] = new_db["reasons"].astype(str)
-            for market in MARKETS:
-                new_db[market] = [market in item.get("markets") for item in items]
-            new_db = new_db[db.drop(columns=["id", "created_at"]).columns]
-            common_rows = new_db.merge(db, on=['uid'], how='inner')
-            new_db = new_db.drop(labels=common_rows.index)
-            count = new_db.to_sql("news", con, index=False, if_exists="append")
-            return count
+            con.execute("BEGIN IMMEDIATE")
+            existing = self._existing_uids(con, rows)
+            con.executemany(
+                f"INSERT INTO news ({columns}) VALUES ({placeholders}) ON CONFLICT(uid) {conflict}",
+                rows.values(),
+            )
+            date_idx, region_idx = NEWS_COLUMNS.index("date"), NEWS_COLUMNS.index("region")
+            self._refresh_rollups(con, {(row[date_idx], row[region_idx]) for row in rows.values()})
+            if on_conflict == "update" or len(rows) > len(existing):
+                con.execute(
+                    """
+                    INSERT INTO meta (key, value) VALUES ('generation', '1')
+                    ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+                    """
+                )
+        if self._uid_index is not None:
+            with self._uid_index_lock:
+                self._uid_index.update(map(self._uid_key, rows))
+        inserted = len(rows) - len(existing)
+        updated = len(existing) if on_conflict == "update" else 0
+        METRICS.count("rows_inserted", inserted)
+        METRICS.count("rows_updated", updated)
+        return inserted, updated
 
 
+    def record_run(
+            self,
+            trigger: str,
+            started_at: dt.datetime,
+            finished_at: dt.datetime,
+            inserted: int,
+            updated: int,
+            failed_sources: int,
+            stats: Dict,
+        ) -> None:
+        with sqlite3.connect(self.db_path) as con:
+            con.execute(
+                """
+                INSERT INTO refresh_runs
+                    (trigger, started_at, finished_at, duration_s, inserted, updated, failed_sources, stats)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    trigger,
+                    started_at.strftime("%Y-%m-%d %H:%M:%S"),
+                    finished_at.strftime("%Y-%m-%d %H:%M:%S"),
+                    (finished_at - started_at).total_seconds(),
+                    inserted,
+                    updated,
+                    failed_sources,
+                    json.dumps(stats),
+                ),
+            )
+
+
+    def recent_runs(self, limit: int = 20) -> List[Dict]:
+        with sqlite3.connect(self.db_path) as con:
+            db = pd.read_sql_query("SELECT * FROM refresh_runs ORDER BY id DESC LIMIT ?", con, params=[limit])
+        db["stats"] = db["stats"].apply(json.loads)
+        return db.to_dict(orient="records")
+
+
+    def earliest_date(self) -> Optional[dt.date]:
+        with sqlite3.connect(self.db_path) as con:
+            row = con.execute("SELECT MIN(date) FROM news").fetchone()
+        return dt.datetime.strptime(row[0], "%Y-%m-%d").date() if row[0] else None
+
+
+    def generation(self) -> int:
+        with sqlite3.connect(self.db_path) as con:
+            row = con.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return int(row[0]) if row else 0
+
+
+    @staticmethod
+    def _markets_mask_sql() -> str:
+        return " + ".join(
+            f'(CASE WHEN "{market}" > 0 THEN {1 << i} ELSE 0 END)' for i, market in enumerate(MARKETS)
+        )
+
+
+    def _rollup_select(self, where: str) -> str:
+        return f"""
+            INSERT INTO news_daily (day, region, markets_mask, n, score_sum, score_n)
+            SELECT COALESCE(date, '{DEFAULT_START_DATE:%Y-%m-%d}'), region, {self._markets_mask_sql()}, COUNT(*),
+                   SUM(CASE WHEN score > 0 THEN score END), SUM(CASE WHEN score > 0 THEN 1 ELSE 0 END)
+            FROM news
+            WHERE {where}
+            GROUP BY 1, 2, 3
+        """
+
+
+    def _rebuild_rollups(self, con: sqlite3.Connection) -> None:
+        con.execute("DELETE FROM news_daily")
+        con.execute(self._rollup_select("1"))
+        con.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('rollup_markets', ?)", (json.dumps(MARKETS),)
+        )
+
+
+    def _refresh_rollups(self, con: sqlite3.Connection, keys: Set[Tuple[Optional[str], str]]) -> None:
+        # Whole (day, region) groups are recomputed from news, so upserts that change
+        # an item's markets or score are reflected without tracking the old values.
+        default_day = DEFAULT_START_DATE.strftime("%Y-%m-%d")
+        for date_str, region in keys:
+            day = date_str or default_day
+            con.execute("DELETE FROM news_daily WHERE day = ? AND region = ?", (day, region))
+            if day == default_day:
+                con.execute(self._rollup_select("region = ? AND (date = ? OR date IS NULL)"), (region, day))
+            else:
+                con.execute(self._rollup_select("region = ? AND date = ?"), (region, day))
+
+
+    def _build_rollup_filters(
+            self,
+            region: Optional[Union[str, List[str]]] = None,
+            start_date: Optional[date] = None,
+            end_date: Optional[date] = None,
+            markets_filter: Optional[List[str]] = None,
+        ) -> Tuple[str, List]:
+        clauses, params = [], []
+        if region is not None:
+            regions = [region] if isinstance(region, str) else list(region)
+            if not regions:
+                return "0", []
+            clauses.append(f"region IN ({', '.join('?' for _ in regions)})")
+            params.extend(regions)
+        if start_date is not None:
+            clauses.append("day >= ?")
+            params.append(start_date.strftime("%Y-%m-%d"))
+        if end_date is not None:
+            clauses.append("day <= ?")
+            params.append(end_date.strftime("%Y-%m-%d"))
+        if markets_filter:
+            mask = sum(1 << MARKETS.index(market) for market in markets_filter if market in MARKETS)
+            clauses.append("(markets_mask & ?) != 0")
+            params.append(mask)
+        return " AND ".join(clauses) or "1", params
+
+
+    def daily_region_stats(
+            self,
+            region: Optional[Union[str, List[str]]] = None,
+            start_date: Optional[date] = None,
+            end_date: Optional[date] = None,
+            markets_filter: Optional[List[str]] = None,
+        ) -> pd.DataFrame:
+        where, params = self._build_rollup_filters(
+            region=region,
+            start_date=start_date,
+            end_date=end_date,
+            markets_filter=markets_filter,
+        )
+        with sqlite3.connect(self.db_path) as con:
+            db = pd.read_sql_query(
+                f"""
+                SELECT day AS Day, region AS Region, SUM(n) AS Count,
+                       SUM(score_sum) / NULLIF(SUM(score_n), 0) AS Score
+                FROM news_daily
+                WHERE {where}
+                GROUP BY day, region
+                ORDER BY day, region
+                """,
+                con,
+                params=params,
+            )
+        db["Day"] = pd.to_datetime(db["Day"], format="%Y-%m-%d").dt.date
+        return db
+
+
+    def daily_market_stats(
+            self,
+            region: Optional[Union[str, List[str]]] = None,
+            start_date: Optional[date] = None,
+            end_date: Optional[date] = None,
+            markets: Optional[List[str]] = None,
+        ) -> pd.DataFrame:
+        markets = [market for market in (markets or MARKETS) if market in MARKETS]
+        if not markets:
+            return pd.DataFrame(columns=["Day", "Market", "Count", "Score"])
+        where, params = self._build_rollup_filters(region=region, start_date=start_date, end_date=end_date)
+        bits = ", ".join("(?, ?)" for _ in markets)
+        bit_params = [value for market in markets for value in (market, 1 << MARKETS.index(market))]
+        with sqlite3.connect(self.db_path) as con:
+            db = pd.read_sql_query(
+                f"""
+                WITH markets(name, bit) AS (VALUES {bits})
+                SELECT d.day AS Day, m.name AS Market, SUM(d.n) AS Count,
+                       SUM(d.score_sum) / NULLIF(SUM(d.score_n), 0) AS Score
+                FROM news_daily AS d JOIN markets AS m ON (d.markets_mask & m.bit) != 0
+                WHERE {where}
+                GROUP BY d.day, m.name
+                ORDER BY d.day, m.name
+                """,
+                con,
+                params=[*bit_params, *params],
+            )
+        db["Day"] = pd.to_datetime(db["Day"], format="%Y-%m-%d").dt.date
+        return db
+
+
+    def _build_filters(
+            self,
+            region: Optional[Union[str, List[str]]] = None,
+            start_date: Optional[date] = None,
+            end_date: Optional[date] = None,
+            markets_filter: Optional[List[str]] = None,
+        ) -> Tuple[str, List]:
+        clauses, params = [], []
+        if region is not None:
+            regions = [region] if isinstance(region, str) else list(region)
+            if not regions:
+                return "0", []
+            clauses.append(f"region IN ({', '.join('?' for _ in regions)})")
+            params.extend(regions)
+
+        # Rows without a date are reported as DEFAULT_START_DATE, so they only match
+        # when that day falls inside the requested range.
+        date_clauses, date_params = [], []
+        if start_date is not None:
+            date_clauses.append("date >= ?")
+            date_params.append(start_date.strftime("%Y-%m-%d"))
+        if end_date is not None:
+            date_clauses.append("date <= ?")
+            date_params.append(end_date.strftime("%Y-%m-%d"))
+        if date_clauses:
+            in_range = (start_date is None or start_date <= DEFAULT_START_DATE) and \
+                       (end_date is None or DEFAULT_START_DATE <= end_date)
+            date_clause = " AND ".join(date_clauses)
+            clauses.append(f"(({date_clause}) OR date IS NULL)" if in_range else date_clause)
+            params.extend(date_params)
+
+        if markets_filter:
+            markets = [market for market in markets_filter if market in MARKETS]
+            if not markets:
+                return "0", []
+            clauses.append("(" + " OR ".join(f'"{market}" > 0' for market in markets) + ")")
+
+        return " AND ".join(clauses) or "1", params
+
+
+    @staticmethod
+    def _order_by(order_by: str) -> str:
+        if order_by not in ORDER_BY:
+            raise ValueError(f"order_by must be one of {sorted(ORDER_BY)}, got {order_by!r}")
+        return ORDER_BY[order_by]
+
+
+    @staticmethod
+    def _collapsed(select: str, order: str) -> str:
+        # Pages over stories instead of rows: a story sits where its first row would, and the
+        # page holds every matching row of its stories, lead first. Takes LIMIT and OFFSET
+        # parameters after those of the inner select.
+        return f"""
+            WITH hits AS ({select}),
+            ranked AS (SELECT *, ROW_NUMBER() OVER (ORDER BY {order}) AS pos FROM hits),
+            stories AS (
+                SELECT {STORY_KEY} AS story, MIN(pos) AS lead FROM ranked
+                GROUP BY story ORDER BY lead LIMIT ? OFFSET ?
+            )
+            SELECT ranked.* FROM ranked JOIN stories ON COALESCE(ranked.cluster, ranked.uid) = stories.story
+            ORDER BY stories.lead, ranked.pos
+        """
+
+
+    def scan(
+            self,
+            columns: Optional[List[str]] = None,
+            region: Optional[Union[str, List[str]]] = None,
+            start_date: Optional[date] = None,
+            end_date: Optional[date] = None,
+            markets_filter: Optional[List[str]] = None,
+        ) -> pd.DataFrame:
+        # Columnar read of the Parquet snapshot (see src/snapshot.py), with market flags as
+        # booleans and reasons as lists; meant for analytics that only need a few columns.
+        if self.snapshot_dir is None:
+            raise ValueError("scan() needs a DBManager created with snapshot_dir")
+        return read_snapshot(
+            self.snapshot_dir,
+            columns=columns,
+            region=region,
+            start_date=start_date,
+            end_date=end_date,
+            markets_filter=markets_filter,
+        )
+
+
+    def _get_snapshot(
+            self, order_by: str, limit: Optional[int], offset: int, collapse: bool = False, **filters
+        ) -> pd.DataFrame:
+        self._order_by(order_by)
+        db = self.scan(**filters)
+        for market in MARKETS:
+            db[market] = db[market].astype(int)
+        db["reasons"] = db["reasons"].map(lambda reasons: json.dumps([] if reasons is None else list(reasons)))
+        db["date"] = db["date"].map(lambda day: None if pd.isnull(day) else day.strftime("%Y-%m-%d"))
+        # Same orderings as ORDER_BY, where NULLs sort last in a descending column.
+        if order_by == "id":
+            db = db.sort_values("id")
+        else:
+            keys = pd.DataFrame({
+                "no_score": db["score"].isna(),
+                "score": db["score"],
+                "day": db["date"].fillna(f"{DEFAULT_START_DATE:%Y-%m-%d}"),
+                "time": db["time"],
+                "id": db["id"],
+            })
+            by = ["no_score", "score", "day", "time", "id"] if order_by == "score" else ["day", "time", "id"]
+            order = keys.sort_values(
+                by, ascending=[column == "no_score" for column in by], na_position="last", kind="stable"
+            ).index
+            db = db.loc[order]
+        end = None if limit is None else offset + limit
+        if collapse:
+            story = db["cluster"].fillna(db["uid"])
+            leads = pd.unique(story)[offset:end]
+            lead_pos = {key: pos for pos, key in enumerate(leads)}
+            on_page = story.map(lead_pos)
+            db = db[on_page.notna()].assign(_lead=on_page[on_page.notna()])
+            return db.sort_values("_lead", kind="stable").drop(columns="_lead").reset_index(drop=True)
+        return db.iloc[offset:end].reset_index(drop=True)
+
+
+    @METRICS.timed("db_get")
     def get(
             self,
-            region: Optional[List[str]] = None,
+            region: Optional[Union[str, List[str]]] = None,
             start_date: Optional[date] = None,
             end_date: Optional[date] = None,
             markets_filter: Optional[List[str]] = None,
+            order_by: str = "id",
+            limit: Optional[int] = None,
+            offset: int = 0,
+            collapse: bool = False,
         ) -> List[Dict]:
+        # With collapse, limit and offset count stories and the rows of every story on the page
+        # are returned together, lead first (see _collapsed).
+        if self.snapshot_dir is not None:
+            return self._to_records(self._get_snapshot(
+                order_by,
+                limit,
+                offset,
+                collapse=collapse,
+                region=region,
+                start_date=start_date,
+                end_date=end_date,
+                markets_filter=markets_filter,
+            ))
+        where, params = self._build_filters(
+            region=region,
+            start_date=start_date,
+            end_date=end_date,
+            markets_filter=markets_filter,
+        )
+        order = self._order_by(order_by)
+        select = f"SELECT * FROM news WHERE {where}"
+        query = self._collapsed(select, order) if collapse else f"{select} ORDER BY {order} LIMIT ? OFFSET ?"
         with sqlite3.connect(self.db_path) as con:
-            db = pd.read_sql_query(f"SELECT * FROM news", con)
-            db.loc[db["date"].notnull(), "date"] = db.loc[db["date"].notnull(), "date"].apply(
-                lambda x: dt.datetime.strptime(x, "%Y-%m-%d").date())
-            db["date"] = db["date"].fillna(DEFAULT_START_DATE)
-            db = db.query(f"region == @region") \
-                .query("date >= @start_date") \
-                .query("date <= @end_date")
-            if markets_filter:
-                db = db[db[markets_filter].gt(0).any(axis=1)]
-            out = db.to_dict(orient="records")
-            return out
+            db = pd.read_sql_query(query, con, params=[*params, -1 if limit is None else limit, offset])
+        return self._to_records(db.drop(columns="pos", errors="ignore"))
+
+
+    def count(
+            self,
+            region: Optional[Union[str, List[str]]] = None,
+            start_date: Optional[date] = None,
+            end_date: Optional[date] = None,
+            markets_filter: Optional[List[str]] = None,
+            collapse: bool = False,
+        ) -> int:
+        if self.snapshot_dir is not None:
+            db = self.scan(
+                columns=["uid", "cluster"] if collapse else ["id"],
+                region=region,
+                start_date=start_date,
+                end_date=end_date,
+                markets_filter=markets_filter,
+            )
+            return int(db["cluster"].fillna(db["uid"]).nunique()) if collapse else len(db)
+        where, params = self._build_filters(
+            region=region,
+            start_date=start_date,
+            end_date=end_date,
+            markets_filter=markets_filter,
+        )
+        counted = f"COUNT(DISTINCT {STORY_KEY})" if collapse else "COUNT(*)"
+        with sqlite3.connect(self.db_path) as con:
+            return con.execute(f"SELECT {counted} FROM news WHERE {where}", params).fetchone()[0]
+
+
+    @METRICS.timed("db_search")
+    def search(
+            self,
+            query: str,
+            region: Optional[Union[str, List[str]]] = None,
+            start_date: Optional[date] = None,
+            end_date: Optional[date] = None,
+            markets_filter: Optional[List[str]] = None,
+            limit: int = 200,
+            offset: int = 0,
+            order_by: str = "rank",
+            collapse: bool = False,
+        ) -> List[Dict]:
+        match = self._fts_query(query)
+        if not match:
+            return []
+        where, params = self._build_filters(
+            region=region,
+            start_date=start_date,
+            end_date=end_date,
+            markets_filter=markets_filter,
+        )
+        order = "rank" if order_by == "rank" else self._order_by(order_by)
+        select = f"""
+            SELECT news.*, bm25(news_fts, 10.0, 3.0, 1.0) AS rank
+            FROM news_fts JOIN news ON news.id = news_fts.rowid
+            WHERE news_fts MATCH ? AND {where}
+        """
+        query = self._collapsed(select, order) if collapse else f"{select} ORDER BY {order} LIMIT ? OFFSET ?"
+        with sqlite3.connect(self.db_path) as con:
+            db = pd.read_sql_query(query, con, params=[match, *params, limit, offset])
+        return self._to_records(db.drop(columns="pos", errors="ignore"))
+
+
+    def search_count(
+            self,
+            query: str,
+            region: Optional[Union[str, List[str]]] = None,
+            start_date: Optional[date] = None,
+            end_date: Optional[date] = None,
+            markets_filter: Optional[List[str]] = None,
+            collapse: bool = False,
+        ) -> int:
+        match = self._fts_query(query)
+        if not match:
+            return 0
+        where, params = self._build_filters(
+            region=region,
+            start_date=start_date,
+            end_date=end_date,
+            markets_filter=markets_filter,
+        )
+        with sqlite3.connect(self.db_path) as con:
+            return con.execute(
+                f"""
+                SELECT {f"COUNT(DISTINCT {STORY_KEY})" if collapse else "COUNT(*)"}
+                FROM news_fts JOIN news ON news.id = news_fts.rowid
+                WHERE news_fts MATCH ? AND {where}
+                """,
+                [match, *params],
+            ).fetchone()[0]
+
+
+    @staticmethod
+    def _fts_query(query: str) -> str:
+        # Quoted phrases are kept together and every other word becomes its own term,
+        # quoted so that user input can never be read as FTS5 syntax.
+        terms = [phrase or word for phrase, word in re.findall(r'"([^"]+)"|(\S+)', query or "")]
+        terms = [term.replace('"', " ").strip() for term in terms]
+        return " ".join(f'"{term}"' for term in terms if term)
+
+
+    def _to_records(self, db: pd.DataFrame) -> List[Dict]:
+        db["date"] = pd.to_datetime(db["date"], format="%Y-%m-%d").dt.date
+        db["date"] = db["date"].astype(object).where(db["date"].notnull(), DEFAULT_START_DATE)
+        out = db.to_dict(orient="records")
+        return out
@@ -0,0 +1,245 @@
+import argparse
+import datetime as dt
+import fcntl
+import logging
+import os
+import random
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import pytz
+
+from settings import (
+    REGIONS, DB_PATH, HTTP_TIMEOUT, INGEST_INTERVAL, INGEST_JITTER, INGEST_MAX_BACKOFF, INGEST_USE_LLM,
+    INGEST_MODEL,
+)
+from src.clustering import StoryClusterer
+from src.db_manager import DBManager
+from src.llm_cache import LLMCache
+from src.metrics import METRICS, Metrics
+from src.news_fetcher import NewsFetcher
+from src.snapshot import SnapshotExporter
+
+
+class IngestLockError(RuntimeError):
+    pass
+
+
+@contextmanager
+def ingest_lock(db_path: str):
+    # An advisory lock next to the database file; the OS releases it if the process dies.
+    with open(f"{db_path}.lock", "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise IngestLockError(f"Another ingester is already writing {db_path}")
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class Ingester:
+
+    def __init__(
+            self,
+            db_manager: DBManager,
+            fetcher: NewsFetcher,
+            use_llm: bool = INGEST_USE_LLM,
+            model: str = INGEST_MODEL,
+            interval: int = INGEST_INTERVAL,
+            jitter: int = INGEST_JITTER,
+            max_backoff: int = INGEST_MAX_BACKOFF,
+            metrics_file: Optional[str] = None,
+            snapshot_dir: Optional[str] = None,
+        ) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.db_manager = db_manager
+        self.fetcher = fetcher
+        self.use_llm = use_llm
+        self.model = model
+        self.interval = interval
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.metrics_file = metrics_file
+        self.snapshot_dir = snapshot_dir
+
+
+    def init(self) -> None:
+        with sqlite3.connect(self.db_manager.db_path) as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingest_schedule (
+                    url TEXT PRIMARY KEY,
+                    next_run_at REAL,
+                    failures INTEGER DEFAULT 0,
+                    last_error TEXT,
+                    last_run_at REAL
+                )
+                """
+            )
+
+
+    def sources(self) -> Dict[str, Dict]:
+        return {
+            src["url"]: src for conf in REGIONS.values() for src in conf.get("sources", []) if src.get("url")
+        }
+
+
+    def due_sources(self, now: float) -> List[str]:
+        with sqlite3.connect(self.db_manager.db_path) as con:
+            schedule = dict(con.execute("SELECT url, next_run_at FROM ingest_schedule").fetchall())
+        return [url for url in self.sources() if (schedule.get(url) or 0) <= now]
+
+
+    def next_wake_up(self) -> float:
+        with sqlite3.connect(self.db_manager.db_path) as con:
+            row = con.execute("SELECT MIN(next_run_at) FROM ingest_schedule").fetchone()
+        return row[0] or time.time()
+
+
+    def reschedule(self, urls: List[str], failed: Dict[str, str], now: float) -> None:
+        sources = self.sources()
+        with sqlite3.connect(self.db_manager.db_path) as con:
+            failures = dict(con.execute("SELECT url, failures FROM ingest_schedule").fetchall())
+            rows = []
+            for url in urls:
+                interval = sources.get(url, {}).get("interval", self.interval)
+                if url in failed:
+                    count = (failures.get(url) or 0) + 1
+                    delay = min(interval * 2 ** count, self.max_backoff)
+                else:
+                    count = 0
+                    delay = interval
+                rows.append((url, now + delay + random.uniform(0, self.jitter), count, failed.get(url), now))
+            con.executemany(
+                """
+                INSERT INTO ingest_schedule (url, next_run_at, failures, last_error, last_run_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    next_run_at = excluded.next_run_at,
+                    failures = excluded.failures,
+                    last_error = excluded.last_error,
+                    last_run_at = excluded.last_run_at
+                """,
+                rows,
+            )
+
+
+    def run_once(self, all_sources: bool = False, backfill_since: Optional[dt.date] = None) -> Dict:
+        now = time.time()
+        urls = list(self.sources()) if all_sources else self.due_sources(now)
+        if not urls:
+            return {"sources": 0, "inserted": 0, "updated": 0, "failed": 0}
+
+        started_at = dt.datetime.now(dt.timezone.utc)
+        before = METRICS.snapshot()
+        inserted, updated = self.fetcher.refresh(
+            end_date=dt.date.today(),
+            use_llm=self.use_llm,
+            model=self.model,
+            sources=urls,
+            start_date=backfill_since,
+            backfill=backfill_since is not None,
+        )
+
+        failed = dict(self.fetcher.failed_sources)
+        self.reschedule(urls, failed, now)
+        self.db_manager.record_run(
+            trigger="ingest",
+            started_at=started_at,
+            finished_at=dt.datetime.now(dt.timezone.utc),
+            inserted=inserted,
+            updated=updated,
+            failed_sources=len(failed),
+            stats=Metrics.delta(before, METRICS.snapshot()),
+        )
+        self.write_metrics()
+        self.write_snapshot(inserted + updated)
+        stats = {"sources": len(urls), "inserted": inserted, "updated": updated, "failed": len(failed)}
+        self.logger.info(f"Ingestion run finished: {stats}")
+        return stats
+
+
+    def write_metrics(self) -> None:
+        if not self.metrics_file:
+            return
+        # Written atomically so a Prometheus textfile collector never reads a partial file.
+        tmp_path = f"{self.metrics_file}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(METRICS.to_prometheus())
+        os.replace(tmp_path, self.metrics_file)
+
+
+    def write_snapshot(self, changed: int) -> None:
+        if not self.snapshot_dir or not changed:
+            return
+        try:
+            SnapshotExporter(self.db_manager.db_path, self.snapshot_dir).export()
+        except Exception as e:
+            self.logger.exception(f"Snapshot export to {self.snapshot_dir} failed: {e}")
+
+
+    def run_forever(self, poll_interval: float = 60) -> None:
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                self.logger.exception(f"Ingestion run failed: {e}")
+            sleep_for = min(max(self.next_wake_up() - time.time(), 1), poll_interval)
+            time.sleep(sleep_for)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fetch, analyse and store regulatory news without the dashboard.")
+    parser.add_argument("--once", action="store_true", help="run the due sources once and exit (for cron)")
+    parser.add_argument("--all", action="store_true", help="ignore the schedule and fetch every source")
+    parser.add_argument("--no-llm", action="store_true", help="use the heuristic classifier only")
+    parser.add_argument("--model", default=INGEST_MODEL)
+    parser.add_argument("--triage", nargs="*", metavar="TIER",
+                        help="screening tiers run before --model, e.g. heuristic gemma3:270m (none to disable)")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--metrics-file", help="write Prometheus text metrics here after every run")
+    parser.add_argument("--snapshot-dir", help="update the Parquet snapshot here after every run that changed rows")
+    parser.add_argument("--backfill", type=dt.date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="page through the archives of every source back to this date, then exit")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    db_manager = DBManager(args.db)
+    db_manager.init()
+    llm_cache = LLMCache(args.db)
+    llm_cache.init()
+    clusterer = StoryClusterer(args.db)
+    clusterer.init()
+    fetcher = NewsFetcher(time_out=HTTP_TIMEOUT, utc=pytz.UTC, db_manager=db_manager, llm_cache=llm_cache,
+                          triage_tiers=args.triage, clusterer=clusterer)
+    ingester = Ingester(db_manager=db_manager, fetcher=fetcher, use_llm=not args.no_llm, model=args.model,
+                        metrics_file=args.metrics_file, snapshot_dir=args.snapshot_dir)
+    ingester.init()
+
+    try:
+        with ingest_lock(args.db):
+            if args.backfill:
+                ingester.run_once(all_sources=True, backfill_since=args.backfill)
+            elif args.once:
+                ingester.run_once(all_sources=args.all)
+            else:
+                if args.all:
+                    ingester.run_once(all_sources=True)
+                ingester.run_forever()
+    except IngestLockError as e:
+        logging.getLogger(__name__).error(str(e))
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
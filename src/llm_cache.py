@@ -0,0 +1,95 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from settings import LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_AGE_DAYS
+from src.context_prompts import ANALYSIS_CONTEXT_PROMPT, BATCH_ANALYSIS_CONTEXT_PROMPT
+
+
+class LLMCache:
+    def __init__(
+            self,
+            db_path: str,
+            max_entries: int = LLM_CACHE_MAX_ENTRIES,
+            max_age_days: int = LLM_CACHE_MAX_AGE_DAYS,
+        ) -> None:
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        prompts = ANALYSIS_CONTEXT_PROMPT + BATCH_ANALYSIS_CONTEXT_PROMPT
+        self.prompt_hash = hashlib.sha256(prompts.encode("utf-8")).hexdigest()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+
+    def init(self) -> None:
+        with sqlite3.connect(self.db_path) as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    assessment TEXT,
+                    created_at REAL,
+                    last_used_at REAL
+                )
+                """
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used_at)")
+        self.evict()
+
+
+    def make_key(self, model: str, title: str, summary: str) -> str:
+        raw = "\x1f".join([model, self.prompt_hash, title or "", summary or ""])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+    def get(self, model: str, title: str, summary: str) -> Optional[Dict]:
+        key = self.make_key(model=model, title=title, summary=summary)
+        with sqlite3.connect(self.db_path) as con:
+            row = con.execute("SELECT assessment FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                con.execute("UPDATE llm_cache SET last_used_at = ? WHERE key = ?", (time.time(), key))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+
+    def put(self, model: str, title: str, summary: str, assessment: Dict) -> None:
+        key = self.make_key(model=model, title=title, summary=summary)
+        now = time.time()
+        with sqlite3.connect(self.db_path) as con:
+            con.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, assessment, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model, json.dumps(assessment), now, now),
+            )
+
+
+    def evict(self) -> int:
+        cutoff = time.time() - self.max_age_days * 86400
+        with sqlite3.connect(self.db_path) as con:
+            removed = con.execute("DELETE FROM llm_cache WHERE created_at < ?", (cutoff,)).rowcount
+            removed += con.execute(
+                """
+                DELETE FROM llm_cache WHERE key NOT IN (
+                    SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT ?
+                )
+                """,
+                (self.max_entries,),
+            ).rowcount
+        return removed
+
+
+    def stats(self) -> Dict:
+        with sqlite3.connect(self.db_path) as con:
+            size = con.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": size}
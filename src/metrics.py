@@ -0,0 +1,125 @@
+import functools
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Metrics:
+
+    def __init__(self, prefix: str = "nbim_news") -> None:
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._timers: Dict[Key, List[float]] = {}
+        self._counters: Dict[Key, float] = {}
+
+
+    @staticmethod
+    def _key(name: str, labels: Dict) -> Key:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            timer = self._timers.setdefault(key, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+
+    def timed(self, name: str, **labels):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+    def snapshot(self) -> Dict[str, List[Dict]]:
+        with self._lock:
+            timers = [
+                {"name": name, "labels": dict(labels), "count": int(c), "total_s": total, "max_s": peak}
+                for (name, labels), (c, total, peak) in self._timers.items()
+            ]
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in self._counters.items()
+            ]
+        return {"timers": timers, "counters": counters}
+
+
+    @classmethod
+    def delta(cls, before: Dict, after: Dict) -> Dict[str, List[Dict]]:
+        # Per-run figures are the difference between two snapshots, so the process-wide
+        # registry keeps monotonic totals for the Prometheus export.
+        old_timers = {cls._key(t["name"], t["labels"]): t for t in before.get("timers", [])}
+        old_counters = {cls._key(c["name"], c["labels"]): c for c in before.get("counters", [])}
+        timers = []
+        for t in after.get("timers", []):
+            old = old_timers.get(cls._key(t["name"], t["labels"]), {})
+            count = t["count"] - old.get("count", 0)
+            if count > 0:
+                timers.append({**t, "count": count, "total_s": t["total_s"] - old.get("total_s", 0.0)})
+        counters = []
+        for c in after.get("counters", []):
+            value = c["value"] - old_counters.get(cls._key(c["name"], c["labels"]), {}).get("value", 0)
+            if value:
+                counters.append({**c, "value": value})
+        return {"timers": timers, "counters": counters}
+
+
+    def to_prometheus(self, snapshot: Optional[Dict] = None) -> str:
+        snapshot = snapshot or self.snapshot()
+
+        def metric_name(name: str) -> str:
+            return f"{self.prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}"
+
+        def escape(value: str) -> str:
+            return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        def label_str(labels: Dict) -> str:
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{k}="{escape(str(v))}"' for k, v in sorted(labels.items())) + "}"
+
+        lines = []
+        seen = set()
+        for t in sorted(snapshot.get("timers", []), key=lambda t: t["name"]):
+            name = metric_name(t["name"]) + "_seconds"
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} summary")
+            lines.append(f"{name}_count{label_str(t['labels'])} {t['count']}")
+            lines.append(f"{name}_sum{label_str(t['labels'])} {t['total_s']:.6f}")
+        for c in sorted(snapshot.get("counters", []), key=lambda c: c["name"]):
+            name = metric_name(c["name"]) + "_total"
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{label_str(c['labels'])} {c['value']:g}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
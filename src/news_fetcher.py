@@ -1,24 +1,72 @@
 import datetime as dt
+import hashlib
 import logging
-import sqlite3
+import threading
 import time
-from typing import List, Dict, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from itertools import islice
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlparse
 import json
-import ollama
-import feedparser
-import pandas as pd
-from bs4 import BeautifulSoup
 
-from settings import REGIONS, MARKETS, DB_PATH, DEFAULT_START_DATE
-from src import ANALYSIS_CONTEXT_PROMPT
+from settings import (
+    REGIONS, MARKETS, DB_PATH, DEFAULT_START_DATE, FETCH_MAX_WORKERS, FETCH_MAX_PER_HOST, LLM_BATCH_SIZE,
+    LLM_PARALLELISM, PIPELINE_COMMIT_EVERY, TRIAGE_TIERS, TRIAGE_MIN_POINTS, TRIAGE_BATCH_SIZE,
+    FETCH_BACKFILL_MAX_PAGES,
+)
+from src import ANALYSIS_CONTEXT_PROMPT, BATCH_ANALYSIS_CONTEXT_PROMPT, TRIAGE_CONTEXT_PROMPT
+from src.db_manager import DBManager
+from src.clustering import StoryClusterer
+from src.llm_cache import LLMCache
+from src.metrics import METRICS
+from src.relevance import RelevanceRules
+from src.sources import SOURCE_ADAPTERS, http_client, next_page_url
+
+
+def batched(iterable: Iterable, n: int) -> Iterator[List]:
+    it = iter(iterable)
+    while chunk := list(islice(it, n)):
+        yield chunk
 
 
 class NewsFetcher():
 
-    def __init__(self, time_out: int, utc) -> None:
+    def __init__(
+            self,
+            time_out: int,
+            utc,
+            max_workers: int = FETCH_MAX_WORKERS,
+            max_per_host: int = FETCH_MAX_PER_HOST,
+            db_manager: Optional[DBManager] = None,
+            llm_cache: Optional[LLMCache] = None,
+            llm_batch_size: int = LLM_BATCH_SIZE,
+            llm_parallelism: int = LLM_PARALLELISM,
+            triage_tiers: Optional[List[str]] = None,
+            triage_min_points: int = TRIAGE_MIN_POINTS,
+            clusterer: Optional[StoryClusterer] = None,
+            backfill_pages: int = FETCH_BACKFILL_MAX_PAGES,
+        ) -> None:
         self.logger = logging.getLogger(__name__)
         self.time_out = time_out
         self.utc = utc
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self._host_slots: Dict[str, threading.Semaphore] = {}
+        self._host_slots_lock = threading.Lock()
+        self.db_manager = db_manager
+        self.llm_cache = llm_cache
+        self.llm_batch_size = llm_batch_size
+        self.llm_parallelism = llm_parallelism
+        self.triage_tiers = TRIAGE_TIERS if triage_tiers is None else triage_tiers
+        self.triage_min_points = triage_min_points
+        self.clusterer = clusterer
+        self._feed_state: Dict[str, Dict] = {}
+        self._pending_feed_state: Dict[str, Dict] = {}
+        self._feed_state_lock = threading.Lock()
+        self.failed_sources: Dict[str, str] = {}
+        self.rules = RelevanceRules()
+        self.backfill_pages = backfill_pages
+        self.backfill_until: Optional[dt.date] = None
 
 
     def parse_date(self, entry) -> Optional[dt.datetime]:
@@ -40,21 +88,55 @@ class NewsFetcher():
         return None
 
 
+    @METRICS.timed("clean_html")
     def clean_html(self, html: str) -> str:
         try:
+            from bs4 import BeautifulSoup
+
             soup = BeautifulSoup(html, "html.parser")
             return soup.get_text(" ", strip=True)
         except Exception:
             return html
 
 
-    def fetch_rss(self, url: str) -> List[Dict]:
-        parsed = feedparser.parse(url)
+    def _host_slot(self, url: str) -> threading.Semaphore:
+        host = urlparse(url).netloc
+        with self._host_slots_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+
+
+    def download(
+            self,
+            url: str,
+            etag: Optional[str] = None,
+            modified: Optional[str] = None,
+        ) -> Optional[Tuple[bytes, Dict]]:
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if modified:
+            headers["If-Modified-Since"] = modified
+        with self._host_slot(url):
+            resp = http_client().get(url, headers=headers, timeout=self.time_out)
+        if resp.status_code == 304:
+            return None
+        resp.raise_for_status()
+        METRICS.count("http_requests", http_version=resp.http_version)
+        return resp.content, {"etag": resp.headers.get("ETag"), "modified": resp.headers.get("Last-Modified")}
+
+
+    @METRICS.timed("parse_rss")
+    def parse_rss(self, content: bytes) -> List[Dict]:
+        import feedparser
+
+        parsed = feedparser.parse(content)
         items = []
         for e in parsed.entries:
             items.append({
                 "title": e.get("title"),
-                "summary_raw": self.clean_html(e.get("summary", "")),
+                "summary_html": e.get("summary", ""),
                 "link": e.get("link"),
                 "date_dt": self.parse_date(e),
             })
@@ -67,36 +149,34 @@ class NewsFetcher():
 
 
     def heuristic_relevance(self, title: str, summary: str) -> Dict:
-        text = f"{title} {summary}".lower()
-        keywords = [
-            "regulat", "policy", "central bank", "interest rate" "inflation", "bank", "capital", "invest"
-        ]
-        relevant = any(k in text for k in keywords)
-        brief = title if len(title) < 180 else title[:177] + "..."
-        markets = [market for market in MARKETS if market in text]
-        return {
-            "relevant": bool(relevant),
-            "markets": markets,
-            "score": 0,
-            "summary": brief if relevant else "",
-            "reasons": []
-        }
+        return self.rules.assess_batch([(title, summary)])[0]
 
 
-    def extract_with_llm(self, model: str, title: str, summary: str, markets: str) -> Dict:
-        prompt = self.build_prompt(title=title, summary=summary, markets=markets)
-        resp = ollama.chat(
-            model=model,
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            options={"temperature":0.0},
+    def build_batch_prompt(
+            self,
+            articles: List[Dict],
+            markets: str,
+            context: str = BATCH_ANALYSIS_CONTEXT_PROMPT,
+        ) -> str:
+        news = "\n".join(
+            f"{i}. TITLE='{article.get('title')}'. SUMMARY='{article.get('summary')}'."
+            for i, article in enumerate(articles)
         )
-        content = resp.get("message", {}).get("content", "")
+        prompt = context + f"MARKETS='{markets}'. News:\n{news}"
+        return prompt
+
+
+    def parse_llm_json(self, content: str, opening: str = "{", closing: str = "}"):
         try:
-            data = json.loads(content)
-        except:
-            data = json.loads(content[3:-3])
+            return json.loads(content)
+        except json.JSONDecodeError:
+            start, end = content.find(opening), content.rfind(closing)
+            if start == -1 or end <= start:
+                raise
+            return json.loads(content[start:end + 1])
+
+
+    def normalise_assessment(self, data: Dict) -> Dict:
         return {
             "relevant": bool(data.get("relevant")),
             "markets": data.get("markets", []),
@@ -106,82 +186,557 @@ class NewsFetcher():
         }
 
 
-    def fetch_news(
+    def chat(self, model: str, prompt: str, mode: str) -> str:
+        import ollama
+
+        with METRICS.timer("llm", model=model, mode=mode):
+            resp = ollama.chat(
+                model=model,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                options={"temperature":0.0},
+            )
+        METRICS.count("llm_calls", model=model, mode=mode)
+        METRICS.count("llm_prompt_tokens", resp.get("prompt_eval_count") or 0, model=model)
+        METRICS.count("llm_completion_tokens", resp.get("eval_count") or 0, model=model)
+        return resp.get("message", {}).get("content", "")
+
+
+    def extract_with_llm(self, model: str, title: str, summary: str, markets: str) -> Dict:
+        prompt = self.build_prompt(title=title, summary=summary, markets=markets)
+        content = self.chat(model=model, prompt=prompt, mode="single")
+        data = self.parse_llm_json(content)
+        return self.normalise_assessment(data)
+
+
+    def batch_order(self, model: str, data, n_articles: int) -> Optional[List[int]]:
+        # Small models sometimes number the articles from 1, which would shift every answer by
+        # one. The ids are only trusted when they are exactly 0..N-1, otherwise the array order
+        # is used if it has one entry per article; None means the batch cannot be placed.
+        if not isinstance(data, list) or not all(isinstance(entry, dict) for entry in data):
+            return None
+        try:
+            ids = [int(entry["id"]) for entry in data]
+        except (KeyError, TypeError, ValueError):
+            ids = None
+        if ids is not None and sorted(ids) == list(range(n_articles)):
+            return ids
+        if len(data) == n_articles:
+            self.logger.warning(f"Batch output from {model} has ids {ids}, using the array order")
+            return list(range(n_articles))
+        self.logger.warning(f"Batch output from {model} has {len(data)} entries for {n_articles} articles")
+        return None
+
+
+    def extract_batch_with_llm(self, model: str, articles: List[Dict], markets: str) -> List[Optional[Dict]]:
+        prompt = self.build_batch_prompt(articles=articles, markets=markets)
+        content = self.chat(model=model, prompt=prompt, mode="batch")
+        out: List[Optional[Dict]] = [None] * len(articles)
+        try:
+            data = self.parse_llm_json(content, opening="[", closing="]")
+        except json.JSONDecodeError:
+            self.logger.warning(f"Malformed batch output from {model}, falling back to single calls")
+            return out
+        order = self.batch_order(model, data, len(articles))
+        if order is None:
+            return out
+        for idx, entry in zip(order, data):
+            out[idx] = self.normalise_assessment(entry)
+        return out
+
+
+    def triage_with_llm(self, model: str, articles: List[Dict]) -> List[Optional[bool]]:
+        prompt = self.build_batch_prompt(articles=articles, markets=MARKETS, context=TRIAGE_CONTEXT_PROMPT)
+        out: List[Optional[bool]] = [None] * len(articles)
+        try:
+            data = self.parse_llm_json(self.chat(model=model, prompt=prompt, mode="triage"), opening="[", closing="]")
+        except Exception as e:
+            self.logger.warning(f"Triage with {model} failed, escalating the batch: {e}")
+            return out
+        # A batch that cannot be placed is escalated whole rather than screened by guesswork.
+        order = self.batch_order(model, data, len(articles))
+        if order is None:
+            return out
+        for idx, entry in zip(order, data):
+            out[idx] = bool(entry.get("relevant"))
+        return out
+
+
+    def triage(self, articles: List[Dict], pending: List[int]) -> List[int]:
+        # Each tier only sees what the previous one passed. A tier that cannot decide on an
+        # item (a failed or malformed model answer) escalates it rather than dropping it.
+        for tier in self.triage_tiers:
+            if not pending:
+                break
+            if tier == "heuristic":
+                points = self.rules.points_batch(
+                    [(articles[i].get("title"), articles[i].get("summary")) for i in pending]
+                )
+                passed = [i for i, p in zip(pending, points) if p >= self.triage_min_points]
+            else:
+                batches = [pending[i:i + TRIAGE_BATCH_SIZE] for i in range(0, len(pending), TRIAGE_BATCH_SIZE)]
+                verdicts = {}
+                with ThreadPoolExecutor(max_workers=min(self.llm_parallelism, len(batches))) as pool:
+                    futures = {
+                        pool.submit(self.triage_with_llm, tier, [articles[i] for i in batch]): batch
+                        for batch in batches
+                    }
+                    for future in as_completed(futures):
+                        verdicts.update(zip(futures[future], future.result()))
+                passed = [i for i in pending if verdicts.get(i) is not False]
+            METRICS.count("triage_screened", len(pending), tier=tier)
+            METRICS.count("triage_escalated", len(passed), tier=tier)
+            self.logger.info(f"Triage {tier}: {len(passed)}/{len(pending)} items escalated")
+            pending = passed
+        return pending
+
+
+    def fetch_rss(self, url: str) -> List[Dict]:
+        content, _ = self.download(url)
+        return self.parse_rss(content)
+
+
+    def fetch_source(self, src: Dict) -> Optional[List[Dict]]:
+        adapter = SOURCE_ADAPTERS.get(src.get("type"))
+        if adapter is None:
+            self.logger.warning(f"No adapter for source type {src.get('type')!r}: {src.get('url')}")
+            return []
+        url = src.get("url")
+        state = self._feed_state.get(url, {})
+        with METRICS.timer("fetch", source=src.get("name")):
+            resp = self.download(url, etag=state.get("etag"), modified=state.get("modified"))
+        if resp is None:
+            return None
+        content, headers = resp
+        content_hash = hashlib.sha256(content).hexdigest()
+        pending = {**headers, "content_hash": content_hash}
+        if content_hash != state.get("content_hash"):
+            # The validators are only kept once the body has been read: a page the adapter
+            # cannot parse must be downloaded and parsed again by the next run.
+            entries = adapter(self, content, src)
+            if self.backfill_until is not None:
+                entries.extend(self.fetch_archive(src, content, self.backfill_until))
+        else:
+            entries = None
+        with self._feed_state_lock:
+            self._pending_feed_state[url] = pending
+        return entries
+
+
+    def fetch_archive(self, src: Dict, content: bytes, until: dt.date) -> List[Dict]:
+        # Backfills follow the links to older pages until a page reaches back past `until`,
+        # runs out of entries or of links, or backfill_pages pages have been read.
+        import httpx
+
+        adapter = SOURCE_ADAPTERS[src.get("type")]
+        entries = []
+        url = src.get("url")
+        seen = {url}
+        for page in range(1, self.backfill_pages):
+            url = next_page_url(content, src, url, page)
+            if url is None or url in seen:
+                break
+            seen.add(url)
+            try:
+                with METRICS.timer("fetch", source=src.get("name")):
+                    content, _ = self.download(url)
+            except httpx.HTTPError as e:
+                self.logger.info(f"Archive of {src.get('name')} ends at {url}: {e}")
+                break
+            page_entries = adapter(self, content, src)
+            METRICS.count("archive_pages", source=src.get("name"))
+            entries.extend(page_entries)
+            dates = [e["date_dt"].date() for e in page_entries if e.get("date_dt")]
+            if not page_entries or (dates and min(dates) < until):
+                break
+        return entries
+
+
+    def load_feed_state(self, ignore: bool = False) -> None:
+        # The stored validators and high-water marks decide what fetch_source and
+        # select_candidates skip; ignoring them refetches and reconsiders every entry.
+        if self.db_manager is not None and not ignore:
+            self._feed_state = self.db_manager.get_feed_states()
+        else:
+            self._feed_state = {}
+
+
+    def take_feed_state(self, url: Optional[str] = None) -> Dict[str, Dict]:
+        with self._feed_state_lock:
+            if url is not None:
+                return {url: self._pending_feed_state.pop(url)} if url in self._pending_feed_state else {}
+            pending, self._pending_feed_state = self._pending_feed_state, {}
+        return pending
+
+
+    def commit_feed_state(self) -> None:
+        pending = self.take_feed_state()
+        if self.db_manager is not None:
+            self.db_manager.set_feed_states(pending)
+
+
+    def default_start_date(self) -> dt.date:
+        db_manager = self.db_manager or DBManager(DB_PATH)
+        return db_manager.earliest_date() or DEFAULT_START_DATE
+
+
+    def _analyse_batch(self, model: str, batch: List[Dict]) -> List[Tuple[Dict, str]]:
+        assessments: List[Optional[Dict]] = [None] * len(batch)
+        if len(batch) > 1:
+            try:
+                assessments = self.extract_batch_with_llm(model=model, articles=batch, markets=MARKETS)
+            except Exception as e:
+                self.logger.warning(f"Batch LLM call failed: {e}")
+
+        out = []
+        for article, assess in zip(batch, assessments):
+            title, summary = article.get("title"), article.get("summary")
+            if assess is None:
+                try:
+                    assess = self.extract_with_llm(model=model, title=title, summary=summary, markets=MARKETS)
+                except Exception as e:
+                    self.logger.exception(f"LLM call failed: {e}")
+                    out.append((self.heuristic_relevance(title, summary), "heuristic"))
+                    continue
+            if self.llm_cache is not None:
+                self.llm_cache.put(model=model, title=title, summary=summary, assessment=assess)
+            out.append((assess, model))
+        return out
+
+
+    def analyse_items(self, articles: List[Dict], use_llm: bool, model: str) -> List[Tuple[Dict, str]]:
+        if not use_llm:
+            assessments = self.rules.assess_batch(
+                [(article.get("title"), article.get("summary")) for article in articles]
+            )
+            return [(assess, "heuristic") for assess in assessments]
+
+        results: List[Optional[Tuple[Dict, str]]] = [None] * len(articles)
+        pending = []
+        for i, article in enumerate(articles):
+            cached = None
+            if self.llm_cache is not None:
+                cached = self.llm_cache.get(model=model, title=article.get("title"), summary=article.get("summary"))
+            if cached is not None:
+                results[i] = (cached, model)
+            else:
+                pending.append(i)
+        METRICS.count("llm_cache_hits", len(articles) - len(pending), model=model)
+        METRICS.count("llm_cache_misses", len(pending), model=model)
+
+        escalated = self.triage(articles, pending)
+        screened_out = set(pending) - set(escalated)
+        for i in screened_out:
+            results[i] = (self.normalise_assessment({}), "triage")
+        pending = escalated
+
+        batches = [pending[i:i + self.llm_batch_size] for i in range(0, len(pending), self.llm_batch_size)]
+        if batches:
+            with ThreadPoolExecutor(max_workers=min(self.llm_parallelism, len(batches))) as pool:
+                futures = {
+                    pool.submit(self._analyse_batch, model, [articles[i] for i in batch]): batch
+                    for batch in batches
+                }
+                for future in as_completed(futures):
+                    for i, result in zip(futures[future], future.result()):
+                        results[i] = result
+        return results
+
+
+    @staticmethod
+    def high_water_stamp(date_dt: dt.datetime) -> str:
+        # A fixed-width UTC string, so marks compare correctly as text in SQL and in Python.
+        if date_dt.tzinfo is None:
+            date_dt = date_dt.replace(tzinfo=dt.timezone.utc)
+        return date_dt.astimezone(dt.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+    def select_candidates(
             self,
             region: str,
+            src: Dict,
+            fetched: List[Dict],
+            start_date: dt.date,
             end_date: dt.date,
-            start_date: dt.date = None,
-            use_llm: bool = False,
-            model: str = "llama3.2:1b",
         ) -> List[Dict]:
-        conf = REGIONS.get(region)
-        if not conf:
-            return []
-        with sqlite3.connect(DB_PATH) as con:
-            db = pd.read_sql_query(f"SELECT * FROM news", con)
-            if len(db) == 0:
-                start_date = DEFAULT_START_DATE
-            if start_date is None:
-                start_date = db.sort_values(by="date")["date"]
-                if start_date.empty:
-                    start_date = DEFAULT_START_DATE
-                else:
-                    start_date = dt.datetime.strptime(start_date.iloc[0], "%Y-%m-%d").date()
-
-            items = []
-
-            for src in conf.get("sources", []):
-                url = src.get("url")
-                if not url:
+        # Entries older than the source's high-water mark (the newest entry of an earlier run)
+        # were already seen and are skipped, however many new ones arrived since; a backfill
+        # ignores the mark. Undated entries are left to the uid lookup.
+        url = src.get("url")
+        state = {} if self.backfill_until is not None else self._feed_state.get(url, {})
+        mark, mark_uid = state.get("high_water_at"), state.get("high_water_uid")
+        newest = None
+        skipped = 0
+        candidates = []
+        for it in fetched:
+            date_dt = it.get("date_dt")
+            if date_dt is not None:
+                d = date_dt.date()
+                if d < start_date or d > end_date:
                     continue
-                try:
-                    if src.get("type") == "rss":
-                        fetched = self.fetch_rss(url)
-                    else:
-                        fetched = []
-                except Exception as e:
-                    self.logger.warning(f"Error fetching {url}: {e}")
+            it["uid"] = DBManager._make_uid({
+                "title": it.get("title"),
+                "date": date_dt.strftime("%Y-%m-%d") if date_dt else None,
+                "source": src.get("name"),
+                "region": region,
+            })
+            if date_dt is not None:
+                stamp = self.high_water_stamp(date_dt)
+                if mark is not None and (stamp < mark or (stamp == mark and it["uid"] == mark_uid)):
+                    skipped += 1
                     continue
+                if newest is None or stamp > newest[0]:
+                    newest = (stamp, it["uid"])
+            it["region"] = region
+            it["source"] = src.get("name")
+            candidates.append(it)
+        METRICS.count("below_high_water", skipped, source=src.get("name"))
+        if newest is not None:
+            # Saved with the feed validators, so the mark only moves once the run is stored.
+            with self._feed_state_lock:
+                self._pending_feed_state.setdefault(url, {}).update(
+                    high_water_at=newest[0], high_water_uid=newest[1]
+                )
+
+        if self.db_manager is not None and candidates:
+            stored = self.db_manager.existing_uids(it["uid"] for it in candidates)
+            candidates = [it for it in candidates if it["uid"] not in stored]
+        # HTML is only cleaned for entries that are new, so already stored items cost a uid lookup.
+        for it in candidates:
+            it["summary_raw"] = self.clean_html(it.pop("summary_html", None) or "")
+        return candidates
+
+
+    def build_item(self, it: Dict, assess: Dict, nlp_method: str) -> Dict:
+        date_dt = it.get("date_dt")
+        region = it.get("region")
+        return {
+            "title": it.get("title", ""),
+            "markets": assess.get("markets"),
+            "score": assess.get("score"),
+            "summary": assess.get("summary") or it.get("summary_raw", "")[:300],
+            "reasons": assess.get("reasons"),
+            "link": it.get("link"),
+            "date": date_dt.strftime("%Y-%m-%d") if date_dt else None,
+            "time": date_dt.strftime("%H-%M-%S") if date_dt else None,
+            "region": region,
+            "zone": REGIONS.get(region, {}).get("zone"),
+            "source": it.get("source"),
+            "extractor": nlp_method,
+            "cluster": it.get("cluster"),
+        }
+
 
-                fetched = fetched[:10]
-                for it in fetched:
-                    date_dt = it.get("date_dt")
-                    if date_dt is not None:
-                        d = date_dt.date()
-                        if d < start_date or d > end_date:
-                            continue
-
-                    title = it.get("title", "")
-                    summary_raw = it.get("summary_raw", "")
-
-                    nlp_method = "heuristic"
-                    if use_llm:
-                        try:
-                            assess = self.extract_with_llm(model=model, title=title, summary=summary_raw, markets=MARKETS)
-                            nlp_method = model
-                        except Exception as e:
-                            self.logger.exception(f"LLM call failed: {e}")
-                            assess = self.heuristic_relevance(title, summary_raw)
-                    else:
-                        assess = self.heuristic_relevance(title, summary_raw)
-
-                    if not assess.get("relevant"):
+    def iter_feeds(self, jobs: List[Tuple[str, Dict]]) -> Iterator[Tuple[str, Dict, List[Dict]]]:
+        # Feeds are downloaded concurrently and handed on as soon as each one completes. Only a
+        # bounded number of downloads are in flight, so parsed feeds never pile up in memory
+        # while the later stages are busy with the LLM.
+        jobs = iter(jobs)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {}
+            while True:
+                for region, src in islice(jobs, 2 * self.max_workers - len(futures)):
+                    futures[pool.submit(self.fetch_source, src)] = (region, src)
+                if not futures:
+                    return
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    region, src = futures.pop(future)
+                    try:
+                        fetched = future.result()
+                    except Exception as e:
+                        self.logger.warning(f"Error fetching {src.get('url')}: {e}")
+                        self.failed_sources[src.get("url")] = str(e)
+                        METRICS.count("feed_errors", source=src.get("name"))
                         continue
+                    if fetched is None:
+                        self.logger.info(f"Unchanged since last refresh: {src.get('url')}")
+                        METRICS.count("feeds_unchanged", source=src.get("name"))
+                        continue
+                    METRICS.count("feed_entries", len(fetched), source=src.get("name"))
+                    yield region, src, fetched
+
+
+    def iter_candidates(
+            self,
+            feeds: Iterable[Tuple[str, Dict, List[Dict]]],
+            start_date: dt.date,
+            end_date: dt.date,
+        ) -> Iterator[Dict]:
+        seen = set()
+        for region, src, fetched in feeds:
+            for it in self.select_candidates(
+                    region=region,
+                    src=src,
+                    fetched=fetched,
+                    start_date=start_date,
+                    end_date=end_date,
+                ):
+                if it["uid"] not in seen:
+                    seen.add(it["uid"])
+                    yield it
+
 
-                    items.append({
-                        "title": title,
-                        "markets": assess.get("markets"),
-                        "score": assess.get("score"),
-                        "summary": assess.get("summary") or summary_raw[:300],
-                        "reasons": assess.get("reasons"),
-                        "link": it.get("link"),
-                        "date": date_dt.strftime("%Y-%m-%d") if date_dt else None,
-                        "time": date_dt.strftime("%H-%M-%S") if date_dt else None,
-                        "region": region,
-                        "zone": conf.get("zone"),
-                        "source": src.get("name"),
-                        "extractor": nlp_method,
-                    })
+    def group_size(self, use_llm: bool) -> int:
+        # Candidates are analysed in groups that fill every parallel LLM batch once, so
+        # candidates from different feeds still share batches. Triage thins each group out,
+        # so groups are then at least one triage batch long.
+        size = self.llm_batch_size * self.llm_parallelism if use_llm else PIPELINE_COMMIT_EVERY
+        if use_llm and self.triage_tiers:
+            size = max(size, TRIAGE_BATCH_SIZE)
+        return size
 
+
+    def analyse_group(self, group: List[Dict], use_llm: bool, model: str) -> List[Dict]:
+        # Near-duplicates share the assessment of the first item of their story, so each
+        # story is analysed once per model, whether it was first seen in this group or an
+        # earlier run.
+        analysis = model if use_llm else "heuristic"
+        stories = self.clusterer.assign(group, analysis) if self.clusterer is not None else {}
+        representatives = {}
+        for it in group:
+            story = it.get("cluster", it["uid"])
+            if story not in stories:
+                representatives.setdefault(story, it)
+        articles = [
+            {"title": it.get("title", ""), "summary": it.get("summary_raw", "")}
+            for it in representatives.values()
+        ]
+        assessments = dict(zip(representatives, self.analyse_items(articles=articles, use_llm=use_llm, model=model)))
+        stories.update(assessments)
+        if self.clusterer is not None:
+            # Like LLMCache, only answers of the requested analysis are kept for later duplicates:
+            # a heuristic fallback after a failed LLM call or a triage screen-out is not.
+            self.clusterer.add(
+                group,
+                {story: assess for story, assess in assessments.items() if assess[1] == analysis},
+                analysis,
+            )
+            METRICS.count("story_duplicates", len(group) - len(representatives))
+        out = []
+        for it in group:
+            assess, nlp_method = stories[it.get("cluster", it["uid"])]
+            if assess.get("relevant"):
+                out.append(self.build_item(it=it, assess=assess, nlp_method=nlp_method))
+        return out
+
+
+    def iter_analysed(self, candidates: Iterable[Dict], use_llm: bool, model: str) -> Iterator[List[Dict]]:
+        # One list per analysed group, so writers can commit at every group boundary.
+        for group in batched(candidates, self.group_size(use_llm)):
+            yield self.analyse_group(group, use_llm=use_llm, model=model)
+
+
+    def stream_groups(
+            self,
+            end_date: dt.date,
+            regions: Optional[List[str]] = None,
+            start_date: dt.date = None,
+            use_llm: bool = False,
+            model: str = "llama3.2:1b",
+            force: bool = False,
+            sources: Optional[Iterable[str]] = None,
+            backfill: bool = False,
+        ) -> Iterator[List[Dict]]:
+        regions = [region for region in (regions or REGIONS) if region in REGIONS]
+        sources = set(sources) if sources is not None else None
+        self.failed_sources = {}
+        # Validators left over from a run that did not finish belong to entries that were never
+        # stored, so they are dropped rather than saved by this run.
+        self.take_feed_state()
+        if start_date is None:
+            start_date = self.default_start_date()
+        self.backfill_until = start_date if backfill else None
+        self.load_feed_state(ignore=force or backfill)
+
+        if self.clusterer is not None:
+            self.clusterer.load()
+
+        jobs = [
+            (region, src) for region in regions for src in REGIONS[region].get("sources", [])
+            if src.get("url") and (sources is None or src.get("url") in sources)
+        ]
+        feeds = self.iter_feeds(jobs)
+        candidates = self.iter_candidates(feeds, start_date=start_date, end_date=end_date)
+        yield from self.iter_analysed(candidates, use_llm=use_llm, model=model)
+
+        if self.llm_cache is not None and use_llm:
+            self.llm_cache.evict()
+            self.logger.info(f"LLM cache: {self.llm_cache.stats()}")
+
+
+    def stream(self, end_date: dt.date, **kwargs) -> Iterator[Dict]:
+        for group in self.stream_groups(end_date=end_date, **kwargs):
+            yield from group
+
+
+    def write(self, groups: Iterable[List[Dict]], commit_every: int = PIPELINE_COMMIT_EVERY) -> Tuple[int, int]:
+        # Every analysed group is committed as soon as it is scored, in chunks of commit_every,
+        # so rows never wait in memory for the relevant items of later groups.
+        inserted = updated = 0
+        for group in groups:
+            for chunk in batched(group, commit_every):
+                chunk_inserted, chunk_updated = self.db_manager.update(chunk)
+                inserted += chunk_inserted
+                updated += chunk_updated
+        return inserted, updated
+
+
+    def refresh(self, end_date: dt.date, commit_every: int = PIPELINE_COMMIT_EVERY, **kwargs) -> Tuple[int, int]:
+        # Rows are committed as soon as they are scored. Feed validators are only saved once
+        # the whole run has gone through, so an interrupted refresh downloads the feeds again,
+        # skips the rows it already stored and takes the finished LLM results from the cache.
+        try:
+            inserted, updated = self.write(self.stream_groups(end_date=end_date, **kwargs), commit_every=commit_every)
+        except BaseException:
+            self.take_feed_state()
+            raise
+        self.commit_feed_state()
+        return inserted, updated
+
+
+    def fetch_all(
+            self,
+            end_date: dt.date,
+            regions: Optional[List[str]] = None,
+            start_date: dt.date = None,
+            use_llm: bool = False,
+            model: str = "llama3.2:1b",
+            force: bool = False,
+            sources: Optional[Iterable[str]] = None,
+        ) -> Dict[str, List[Dict]]:
+        regions = [region for region in (regions or REGIONS) if region in REGIONS]
+        results = {region: [] for region in regions}
+        for item in self.stream(
+                end_date=end_date,
+                regions=regions,
+                start_date=start_date,
+                use_llm=use_llm,
+                model=model,
+                force=force,
+                sources=sources,
+            ):
+            results[item["region"]].append(item)
+        for items in results.values():
             items.sort(key=lambda x: x.get("date") or "0000-00-00", reverse=True)
-            return items
+        return results
+
+
+    def fetch_news(
+            self,
+            region: str,
+            end_date: dt.date,
+            start_date: dt.date = None,
+            use_llm: bool = False,
+            model: str = "llama3.2:1b",
+        ) -> List[Dict]:
+        if region not in REGIONS:
+            return []
+        return self.fetch_all(
+            end_date=end_date,
+            regions=[region],
+            start_date=start_date,
+            use_llm=use_llm,
+            model=model,
+        )[region]
@@ -0,0 +1,149 @@
+import math
+import re
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from settings import (
+    MARKETS, RELEVANCE_TERMS, MARKET_LEXICONS, HEURISTIC_MARKET_WEIGHT, HEURISTIC_POINTS_PER_SCORE,
+)
+
+
+class RelevanceRules:
+
+    def __init__(
+            self,
+            terms: Dict[str, int] = RELEVANCE_TERMS,
+            lexicons: Dict[str, List[str]] = MARKET_LEXICONS,
+            market_weight: int = HEURISTIC_MARKET_WEIGHT,
+            points_per_score: int = HEURISTIC_POINTS_PER_SCORE,
+        ) -> None:
+        self.market_weight = market_weight
+        self.points_per_score = points_per_score
+        self._weights: Dict[str, int] = {}
+        self._markets: Dict[str, List[str]] = {}
+        for term, weight in terms.items():
+            self._weights[self._normalise(term)] = weight
+        for market in MARKETS:
+            for term in [market, *lexicons.get(market, [])]:
+                self._markets.setdefault(self._normalise(term), []).append(market)
+        vocabulary = set(self._weights) | set(self._markets)
+        self._resolved: Dict[str, Optional[str]] = {}
+        self._prefixes = sorted((term[:-1] for term in vocabulary if term.endswith("*")), key=len, reverse=True)
+        self._pattern = re.compile(r"\b" + self._trie_pattern(vocabulary), re.IGNORECASE)
+
+
+    @staticmethod
+    def _normalise(term: str) -> str:
+        return " ".join(term.lower().replace("-", " ").split())
+
+
+    @staticmethod
+    def _trie_pattern(vocabulary: Iterable[str]) -> str:
+        # All terms are compiled into one alternation factored as a character trie, so the regex
+        # engine branches once per character instead of trying every term at every word.
+        trie: Dict = {}
+        for term in vocabulary:
+            node = trie
+            for char in term.rstrip("*"):
+                node = node.setdefault(char, {})
+            node[""] = "prefix" if term.endswith("*") else "word"
+
+        def emit(node: Dict) -> str:
+            alternatives = [
+                (r"[\s-]+" if char == " " else re.escape(char)) + emit(child)
+                for char, child in sorted(node.items()) if char
+            ]
+            if node.get("") == "prefix":
+                alternatives.append(r"\w*")
+            elif node.get("") == "word":
+                alternatives.append(r"s?\b")
+            return alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+
+        return emit(trie)
+
+
+    def _resolve(self, match: str) -> Optional[str]:
+        if match not in self._resolved:
+            self._resolved[match] = self._lookup(match)
+        return self._resolved[match]
+
+
+    def _lookup(self, match: str) -> Optional[str]:
+        text = self._normalise(match)
+        for candidate in (text, text[:-1] if text.endswith("s") else None):
+            if candidate in self._weights or candidate in self._markets:
+                return candidate
+        for prefix in self._prefixes:
+            if text.startswith(prefix):
+                return prefix + "*"
+        return None
+
+
+    def matches(self, texts: List[str]) -> List[List[Tuple[str, str]]]:
+        # The batch is joined into a single string and scanned in one pass; match offsets are
+        # mapped back to their text with a binary search over the start positions. The NUL
+        # separator is neither a word character nor whitespace, so no match spans two texts.
+        starts, position = [], 0
+        for text in texts:
+            starts.append(position)
+            position += len(text) + 1
+        found: List[List[Tuple[str, str]]] = [[] for _ in texts]
+        for match in self._pattern.finditer("\x00".join(texts)):
+            word = match.group(0).lower()
+            term = self._resolve(word)
+            if term is not None:
+                found[bisect_right(starts, match.start()) - 1].append((term, word))
+        return found
+
+
+    @staticmethod
+    def _first_spellings(matches: Iterable[Tuple[str, str]]) -> Dict[str, str]:
+        # Each term counts once however often it appears; the first spelling is kept for the reasons.
+        words = {}
+        for term, word in matches:
+            words.setdefault(term, word)
+        return words
+
+
+    def _points(self, terms: Iterable[str], markets: List[str]) -> int:
+        return sum(self._weights.get(term, 0) for term in terms) + self.market_weight * len(markets)
+
+
+    def _matched_markets(self, terms: Iterable[str]) -> List[str]:
+        return list(dict.fromkeys(market for term in terms for market in self._markets.get(term, [])))
+
+
+    def assess(self, matches: Iterable[Tuple[str, str]], title: str) -> Dict:
+        words = self._first_spellings(matches)
+        topics = [term for term in words if term in self._weights]
+        relevant = bool(topics)
+        markets = self._matched_markets(words) if relevant else []
+        points = self._points(topics, markets)
+        score = min(5, max(1, math.ceil(points / self.points_per_score))) if relevant else 0
+        brief = title if len(title) < 180 else title[:177] + "..."
+        return {
+            "relevant": relevant,
+            "markets": markets,
+            "score": score,
+            "summary": brief if relevant else "",
+            "reasons": [f"Mentions {', '.join(words[term] for term in topics)}"] if relevant else [],
+        }
+
+
+    def assess_batch(self, articles: List[Tuple[str, str]]) -> List[Dict]:
+        texts = [f"{title or ''} {summary or ''}" for title, summary in articles]
+        return [
+            self.assess(matches, title or "")
+            for (title, _), matches in zip(articles, self.matches(texts))
+        ]
+
+
+    def points_batch(self, articles: List[Tuple[str, str]]) -> List[int]:
+        # Unlike assess, market terms count even without a policy term, so items that only
+        # mention a market still reach the next tier when the threshold allows it.
+        texts = [f"{title or ''} {summary or ''}" for title, summary in articles]
+        points = []
+        for matches in self.matches(texts):
+            words = self._first_spellings(matches)
+            points.append(self._points(words, self._matched_markets(words)))
+        return points
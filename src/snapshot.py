@@ -0,0 +1,235 @@
+import argparse
+import datetime as dt
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+from datetime import date
+from typing import Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from settings import MARKETS, DB_PATH, DEFAULT_START_DATE, SNAPSHOT_DIR
+
+
+STATE_FILE = "_state.json"
+
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+# pyarrow is only needed by the snapshot commands and the snapshot read mode, so it is
+# imported on first use and the dashboard and the ingester start without it.
+def _arrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.fs as fs
+    except ImportError as e:
+        raise RuntimeError("Parquet snapshots need pyarrow: pip install pyarrow") from e
+    return pa, ds, fs
+
+
+def snapshot_schema():
+    pa, _, _ = _arrow()
+    return pa.schema([
+        ("id", pa.int64()),
+        ("uid", pa.string()),
+        ("title", pa.string()),
+        ("link", pa.string()),
+        ("time", pa.string()),
+        ("zone", pa.string()),
+        ("source", pa.string()),
+        *((market, pa.bool_()) for market in MARKETS),
+        ("reasons", pa.list_(pa.string())),
+        ("score", pa.int64()),
+        ("summary", pa.string()),
+        ("cluster", pa.string()),
+        ("created_at", pa.string()),
+        ("region", pa.string()),
+        ("date", pa.date32()),
+    ])
+
+
+def _partitioning():
+    pa, ds, _ = _arrow()
+    return ds.HivePartitioning(
+        pa.schema([("region", pa.string()), ("date", pa.date32())]),
+        null_fallback=NULL_PARTITION,
+    )
+
+
+def _parse_reasons(reasons: Optional[str]) -> List[str]:
+    if not reasons:
+        return []
+    try:
+        value = json.loads(reasons)
+    except json.JSONDecodeError:
+        return [reasons]
+    return [str(r) for r in value] if isinstance(value, list) else [str(value)]
+
+
+def to_arrow(db: pd.DataFrame):
+    pa, _, _ = _arrow()
+    db = db.copy()
+    for market in MARKETS:
+        db[market] = db[market].fillna(0).astype(int) > 0
+    db["reasons"] = db["reasons"].map(_parse_reasons)
+    db["score"] = pd.to_numeric(db["score"], errors="coerce").astype("Int64")
+    db["date"] = pd.to_datetime(db["date"], format="%Y-%m-%d", errors="coerce").dt.date
+    for column in ("cluster", "created_at"):
+        if column not in db:
+            db[column] = None
+        db[column] = db[column].astype(object).where(db[column].notnull(), None).map(
+            lambda value: value if value is None else str(value)
+        )
+    schema = snapshot_schema()
+    return pa.Table.from_pandas(db[schema.names], schema=schema, preserve_index=False)
+
+
+class SnapshotExporter:
+
+    def __init__(self, db_path: str = DB_PATH, out_dir: str = SNAPSHOT_DIR) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        self.out_dir = out_dir
+
+
+    def state(self) -> Dict:
+        path = os.path.join(self.out_dir, STATE_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+
+    def _partition_rows(self, con: sqlite3.Connection, keys: List[Tuple[Optional[str], str]]) -> pd.DataFrame:
+        frames = []
+        for i in range(0, len(keys), 200):
+            chunk = keys[i:i + 200]
+            where = " OR ".join("(date IS ? AND region IS ?)" for _ in chunk)
+            params = [value for key in chunk for value in key]
+            frames.append(pd.read_sql_query(f"SELECT * FROM news WHERE {where}", con, params=params))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+    def export(self, full: bool = False) -> Dict:
+        # Rows past the id high-water mark of the last export tell which (region, day)
+        # partitions changed; those partitions are rewritten whole, so the files never hold
+        # half of a partition. Upserts of older rows elsewhere are picked up by --full.
+        _, ds, _ = _arrow()
+        state = {} if full else self.state()
+        high_water = state.get("high_water_id", 0)
+        # One read transaction, so the high-water mark and the rows come from the same snapshot
+        # of the database; readers never take the write lock, so ingestion is not blocked.
+        con = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            con.execute("BEGIN")
+            max_id = con.execute("SELECT COALESCE(MAX(id), 0) FROM news").fetchone()[0]
+            if not state:
+                db = pd.read_sql_query("SELECT * FROM news", con)
+                keys = None
+            else:
+                keys = con.execute("SELECT DISTINCT date, region FROM news WHERE id > ?", (high_water,)).fetchall()
+                db = self._partition_rows(con, keys)
+        finally:
+            con.close()
+
+        if keys is None and os.path.isdir(self.out_dir):
+            shutil.rmtree(self.out_dir)
+        os.makedirs(self.out_dir, exist_ok=True)
+        if len(db):
+            ds.write_dataset(
+                to_arrow(db),
+                self.out_dir,
+                format="parquet",
+                partitioning=_partitioning(),
+                basename_template="part-{i}.parquet",
+                existing_data_behavior="delete_matching",
+            )
+        stats = {
+            "high_water_id": max_id,
+            "exported_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+            "rows": len(db),
+            "partitions": len(keys) if keys is not None else int(db.groupby(["region", "date"], dropna=False).ngroups),
+            "full": keys is None,
+        }
+        tmp_path = os.path.join(self.out_dir, f"{STATE_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(stats, f)
+        os.replace(tmp_path, os.path.join(self.out_dir, STATE_FILE))
+        self.logger.info(f"Snapshot export: {stats}")
+        return stats
+
+
+def read_snapshot(
+        snapshot_dir: str,
+        columns: Optional[List[str]] = None,
+        region: Optional[Union[str, List[str]]] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        markets_filter: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+    # Files are memory-mapped and only the requested columns are read; region and date
+    # filters prune whole partitions before any file is opened.
+    pa, ds, fs = _arrow()
+    schema = snapshot_schema()
+    if not os.path.isdir(snapshot_dir) or not any(
+            entry.startswith("region=") for entry in os.listdir(snapshot_dir)
+        ):
+        return schema.empty_table().to_pandas().loc[:, columns or schema.names]
+    dataset = ds.dataset(
+        snapshot_dir,
+        schema=schema,
+        format="parquet",
+        partitioning=_partitioning(),
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+        exclude_invalid_files=True,
+    )
+
+    condition = None
+
+    def both(expression):
+        return expression if condition is None else condition & expression
+
+    if region is not None:
+        regions = [region] if isinstance(region, str) else list(region)
+        condition = both(ds.field("region").isin(pa.array(regions, type=pa.string())))
+    date_condition = None
+    if start_date is not None:
+        date_condition = ds.field("date") >= start_date
+    if end_date is not None:
+        upper = ds.field("date") <= end_date
+        date_condition = upper if date_condition is None else date_condition & upper
+    if date_condition is not None:
+        # Rows without a date are reported as DEFAULT_START_DATE, as in DBManager._build_filters.
+        in_range = (start_date is None or start_date <= DEFAULT_START_DATE) and \
+                   (end_date is None or DEFAULT_START_DATE <= end_date)
+        condition = both(date_condition | ds.field("date").is_null() if in_range else date_condition)
+    if markets_filter:
+        markets = [market for market in markets_filter if market in MARKETS]
+        market_condition = ds.scalar(False)
+        for market in markets:
+            market_condition = market_condition | ds.field(market)
+        condition = both(market_condition)
+
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Export the news table to a Parquet snapshot partitioned by region and day."
+    )
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--out", default=SNAPSHOT_DIR)
+    parser.add_argument("--full", action="store_true",
+                        help="rewrite the whole snapshot instead of the changed partitions")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level="INFO", format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    print(json.dumps(SnapshotExporter(args.db, args.out).export(full=args.full)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
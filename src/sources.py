@@ -0,0 +1,221 @@
+import datetime as dt
+import importlib.util
+import io
+import json
+import re
+import threading
+import xml.etree.ElementTree as ET
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse
+
+from settings import HTTP_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE
+
+# httpx, feedparser and BeautifulSoup are imported where they are used: only the ingestion
+# needs them, and the dashboard starts faster without them.
+if TYPE_CHECKING:
+    import httpx
+
+
+USER_AGENT = "Mozilla/5.0 (nbim-news)"
+
+_client: Optional["httpx.Client"] = None
+_client_lock = threading.Lock()
+
+
+def http_client() -> "httpx.Client":
+    # One keep-alive pool for every source and every thread, so repeated requests to a host
+    # reuse their connection. httpx asks for gzip/deflate and decodes it; HTTP/2 is used when
+    # the optional h2 package is installed.
+    import httpx
+
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                http2=importlib.util.find_spec("h2") is not None,
+                timeout=HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                ),
+                headers={"User-Agent": USER_AGENT},
+                follow_redirects=True,
+            )
+        return _client
+
+
+# Adapters turn a downloaded page into entries shaped like parse_rss output: title, summary_html,
+# link and date_dt. They are keyed by the "type" of a source in settings.REGIONS, and a source's
+# other keys configure them.
+SOURCE_ADAPTERS: Dict[str, Callable[[Any, bytes, Dict], List[Dict]]] = {}
+
+
+# Pagers find the link to the next, older page of a source for backfills.
+SOURCE_PAGERS: Dict[str, Callable[[bytes, Dict], Optional[str]]] = {}
+
+
+def register_adapter(source_type: str):
+    def decorator(fn):
+        SOURCE_ADAPTERS[source_type] = fn
+        return fn
+    return decorator
+
+
+def register_pager(source_type: str):
+    def decorator(fn):
+        SOURCE_PAGERS[source_type] = fn
+        return fn
+    return decorator
+
+
+def next_page_url(content: bytes, src: Dict, url: str, page: int) -> Optional[str]:
+    # "page_param" pages by query parameter (WordPress feeds take ?paged=2), otherwise the
+    # page itself has to link to the next one.
+    if src.get("page_param"):
+        parsed = urlparse(src["url"])
+        query = [(k, v) for k, v in parse_qsl(parsed.query) if k != src["page_param"]]
+        return parsed._replace(query=urlencode([*query, (src["page_param"], page + 1)])).geturl()
+    pager = SOURCE_PAGERS.get(src.get("type"))
+    link = pager(content, src) if pager is not None else None
+    return urljoin(url, link) if link else None
+
+
+def parse_date_text(value: Optional[str], utc, fmt: Optional[str] = None) -> Optional[dt.datetime]:
+    if not value:
+        return None
+    value = value.strip()
+    parsers = [lambda v: dt.datetime.strptime(v, fmt)] if fmt else [
+        lambda v: dt.datetime.fromisoformat(v.replace("Z", "+00:00")),
+        parsedate_to_datetime,
+    ]
+    for parse in parsers:
+        try:
+            parsed = parse(value)
+        except (ValueError, TypeError):
+            continue
+        return parsed.replace(tzinfo=utc) if parsed.tzinfo is None else parsed.astimezone(utc)
+    return None
+
+
+def _newest_first(entries: List[Dict]) -> List[Dict]:
+    # Candidates are taken from the top of a source, which feeds already sort newest first.
+    return sorted(
+        entries, key=lambda e: e["date_dt"].timestamp() if e["date_dt"] else float("-inf"), reverse=True
+    )
+
+
+@register_adapter("rss")
+def rss_adapter(fetcher, content: bytes, src: Dict) -> List[Dict]:
+    return fetcher.parse_rss(content)
+
+
+@register_pager("rss")
+def rss_pager(content: bytes, src: Dict) -> Optional[str]:
+    # RFC 5005 archived feeds link to older documents with prev-archive, paged feeds with next.
+    import feedparser
+
+    links = {link.get("rel"): link.get("href") for link in feedparser.parse(content).feed.get("links", [])}
+    return links.get("prev-archive") or links.get("next")
+
+
+@register_adapter("html-list")
+def html_list_adapter(fetcher, content: bytes, src: Dict) -> List[Dict]:
+    # A listing page: every element matching "item" is one entry, and the CSS selectors below
+    # are looked up inside it. Dates come from a datetime attribute when there is one.
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, "html.parser")
+    entries = []
+    for node in soup.select(src.get("item", "article")):
+        title = node.select_one(src.get("title", "h1, h2, h3, a"))
+        link = node.select_one(src.get("link", "a[href]"))
+        date = node.select_one(src.get("date", "time"))
+        summary = node.select_one(src.get("summary", "p"))
+        if title is None or not title.get_text(strip=True):
+            continue
+        date_text = date and (date.get("datetime") or date.get_text(" ", strip=True))
+        entries.append({
+            "title": title.get_text(" ", strip=True),
+            "summary_html": str(summary) if summary is not None else "",
+            "link": urljoin(src["url"], link["href"]) if link is not None and link.get("href") else src["url"],
+            "date_dt": parse_date_text(date_text, fetcher.utc, src.get("date_format")),
+        })
+    return entries
+
+
+@register_pager("html-list")
+def html_list_pager(content: bytes, src: Dict) -> Optional[str]:
+    from bs4 import BeautifulSoup
+
+    link = BeautifulSoup(content, "html.parser").select_one(src.get("next", "a[rel~=next]"))
+    return link.get("href") if link is not None else None
+
+
+def _path(data: Any, path: Optional[str]) -> Any:
+    for key in (path or "").split("."):
+        if not key:
+            continue
+        if isinstance(data, list):
+            data = data[int(key)] if key.isdigit() and int(key) < len(data) else None
+        elif isinstance(data, dict):
+            data = data.get(key)
+        else:
+            return None
+    return data
+
+
+@register_adapter("json-api")
+def json_api_adapter(fetcher, content: bytes, src: Dict) -> List[Dict]:
+    # "items" is the dotted path to the list of records and "fields" maps title, link, date and
+    # summary to dotted paths inside a record.
+    fields = {"title": "title", "link": "url", "date": "date", "summary": "summary", **src.get("fields", {})}
+    records = _path(json.loads(content), src.get("items")) or []
+    entries = []
+    for record in records:
+        title = _path(record, fields["title"])
+        if not title:
+            continue
+        link = _path(record, fields["link"])
+        date = _path(record, fields["date"])
+        entries.append({
+            "title": str(title),
+            "summary_html": str(_path(record, fields["summary"]) or ""),
+            "link": urljoin(src["url"], str(link)) if link else src["url"],
+            "date_dt": parse_date_text(str(date) if date is not None else None, fetcher.utc, src.get("date_format")),
+        })
+    return _newest_first(entries)
+
+
+@register_pager("json-api")
+def json_api_pager(content: bytes, src: Dict) -> Optional[str]:
+    link = _path(json.loads(content), src.get("next")) if src.get("next") else None
+    return str(link) if link else None
+
+
+@register_adapter("sitemap")
+def sitemap_adapter(fetcher, content: bytes, src: Dict) -> List[Dict]:
+    # Sitemaps can list thousands of pages, so they are parsed element by element and every
+    # <url> is dropped once read. Google News tags give the title and date when present,
+    # otherwise the title is taken from the last path segment.
+    include = re.compile(src["include"]) if src.get("include") else None
+    entries = []
+    for _, node in ET.iterparse(io.BytesIO(content), events=("end",)):
+        if node.tag.rsplit("}", 1)[-1] != "url":
+            continue
+        values = {child.tag.rsplit("}", 1)[-1]: (child.text or "").strip() for child in node.iter()}
+        node.clear()
+        loc = values.get("loc")
+        if not loc or (include is not None and not include.search(loc)):
+            continue
+        slug = urlparse(loc).path.rstrip("/").rsplit("/", 1)[-1]
+        title = values.get("title") or re.sub(r"[-_]+", " ", re.sub(r"\.\w+$", "", slug)).strip().capitalize()
+        if not title:
+            continue
+        entries.append({
+            "title": title,
+            "summary_html": "",
+            "link": loc,
+            "date_dt": parse_date_text(values.get("publication_date") or values.get("lastmod"), fetcher.utc),
+        })
+    return _newest_first(entries)
@@ -0,0 +1,259 @@
+import json
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from settings import QUEUE_LEASE_SECONDS, QUEUE_MAX_ATTEMPTS, QUEUE_RETRY_DELAY
+from src.metrics import METRICS
+
+
+# (kind, key, payload); tasks with the same kind and key are only queued once while one is
+# waiting or running, tasks without a key are always queued.
+NewTask = Tuple[str, Optional[str], Dict]
+
+
+class WorkQueue:
+
+    def __init__(
+            self,
+            db_path: str,
+            lease_seconds: float = QUEUE_LEASE_SECONDS,
+            max_attempts: int = QUEUE_MAX_ATTEMPTS,
+            retry_delay: float = QUEUE_RETRY_DELAY,
+        ) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+
+    def init(self) -> None:
+        with self._connect() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS work_queue (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    key TEXT,
+                    payload TEXT NOT NULL,
+                    attempts INTEGER DEFAULT 0,
+                    available_at REAL NOT NULL,
+                    lease_owner TEXT,
+                    lease_until REAL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            con.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_work_queue_key ON work_queue(kind, key)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_work_queue_ready ON work_queue(kind, available_at)")
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS work_dead (
+                    id INTEGER PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    key TEXT,
+                    payload TEXT NOT NULL,
+                    attempts INTEGER,
+                    last_error TEXT,
+                    created_at REAL,
+                    failed_at REAL
+                )
+                """
+            )
+
+
+    def _connect(self) -> sqlite3.Connection:
+        # Every worker process opens its own connections; the timeout makes them wait for each
+        # other's short write transactions instead of failing with "database is locked".
+        return sqlite3.connect(self.db_path, timeout=30)
+
+
+    @contextmanager
+    def _transaction(self):
+        con = self._connect()
+        try:
+            # BEGIN IMMEDIATE takes the write lock up front, so two workers can never lease the
+            # same task between the SELECT and the UPDATE.
+            con.execute("BEGIN IMMEDIATE")
+            yield con
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+        finally:
+            con.close()
+
+
+    @staticmethod
+    def _put(con: sqlite3.Connection, tasks: Iterable[NewTask], now: float) -> int:
+        cur = con.executemany(
+            """
+            INSERT OR IGNORE INTO work_queue (kind, key, payload, available_at, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [(kind, key, json.dumps(payload, default=str), now, now) for kind, key, payload in tasks],
+        )
+        return cur.rowcount
+
+
+    def put(self, tasks: Iterable[NewTask]) -> int:
+        tasks = list(tasks)
+        if not tasks:
+            return 0
+        with self._transaction() as con:
+            added = self._put(con, tasks, time.time())
+        for kind in {kind for kind, _, _ in tasks}:
+            METRICS.count("queue_put", sum(1 for t in tasks if t[0] == kind), kind=kind)
+        return added
+
+
+    def _bury(self, con: sqlite3.Connection, ids: List[int], error: Optional[str], now: float) -> None:
+        marks = ", ".join("?" for _ in ids)
+        if error is not None:
+            con.execute(f"UPDATE work_queue SET last_error = ? WHERE id IN ({marks})", [error, *ids])
+        con.execute(
+            f"""
+            INSERT OR REPLACE INTO work_dead (id, kind, key, payload, attempts, last_error, created_at, failed_at)
+            SELECT id, kind, key, payload, attempts, last_error, created_at, ? FROM work_queue WHERE id IN ({marks})
+            """,
+            [now, *ids],
+        )
+        con.execute(f"DELETE FROM work_queue WHERE id IN ({marks})", ids)
+
+
+    def lease(self, kind: str, owner: str, limit: int = 1) -> List[Dict]:
+        # A task is free when it is due and nobody holds an unexpired lease on it, so the tasks
+        # of a worker that died are handed out again once their lease runs out.
+        now = time.time()
+        with self._transaction() as con:
+            rows = con.execute(
+                """
+                SELECT id, key, payload, attempts FROM work_queue
+                WHERE kind = ? AND available_at <= ? AND (lease_until IS NULL OR lease_until < ?)
+                ORDER BY available_at, id
+                LIMIT ?
+                """,
+                (kind, now, now, limit),
+            ).fetchall()
+            exhausted = [row[0] for row in rows if row[3] >= self.max_attempts]
+            if exhausted:
+                self._bury(con, exhausted, "lease expired", now)
+                METRICS.count("queue_dead", len(exhausted), kind=kind)
+            rows = [row for row in rows if row[3] < self.max_attempts]
+            if rows:
+                ids = [row[0] for row in rows]
+                con.execute(
+                    f"""
+                    UPDATE work_queue SET lease_owner = ?, lease_until = ?, attempts = attempts + 1
+                    WHERE id IN ({", ".join("?" for _ in ids)})
+                    """,
+                    [owner, now + self.lease_seconds, *ids],
+                )
+        METRICS.count("queue_leased", len(rows), kind=kind)
+        return [
+            {"id": row_id, "kind": kind, "key": key, "payload": json.loads(payload), "attempts": attempts + 1}
+            for row_id, key, payload, attempts in rows
+        ]
+
+
+    def complete(self, tasks: List[Dict], owner: str, follow_ups: Iterable[NewTask] = ()) -> int:
+        # Finishing a task and queueing the work it produced is one transaction, so a crash
+        # never loses the follow-ups of a task that is gone. A worker whose lease ran out and
+        # was handed to another one finishes nothing, and its follow-ups are dropped.
+        ids = [task["id"] for task in tasks]
+        if not ids:
+            return 0
+        follow_ups = list(follow_ups)
+        now = time.time()
+        with self._transaction() as con:
+            cur = con.execute(
+                f"DELETE FROM work_queue WHERE lease_owner = ? AND id IN ({', '.join('?' for _ in ids)})",
+                [owner, *ids],
+            )
+            done = cur.rowcount
+            if done:
+                self._put(con, follow_ups, now)
+        if done < len(ids):
+            self.logger.warning(f"{len(ids) - done} tasks were no longer leased by {owner}")
+        METRICS.count("queue_done", done, kind=tasks[0]["kind"])
+        return done
+
+
+    def fail(self, tasks: List[Dict], owner: str, error: str) -> None:
+        # Failed tasks come back after an exponential delay and go to the dead-letter table
+        # once they have used up their attempts.
+        now = time.time()
+        with self._transaction() as con:
+            for task in tasks:
+                if task["attempts"] >= self.max_attempts:
+                    owned = con.execute(
+                        "SELECT 1 FROM work_queue WHERE id = ? AND lease_owner = ?", (task["id"], owner)
+                    ).fetchone()
+                    if owned:
+                        self._bury(con, [task["id"]], error, now)
+                        METRICS.count("queue_dead", kind=task["kind"])
+                    continue
+                con.execute(
+                    """
+                    UPDATE work_queue
+                    SET available_at = ?, lease_owner = NULL, lease_until = NULL, last_error = ?
+                    WHERE id = ? AND lease_owner = ?
+                    """,
+                    (now + self.retry_delay * 2 ** (task["attempts"] - 1), error, task["id"], owner),
+                )
+                METRICS.count("queue_retries", kind=task["kind"])
+
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        now = time.time()
+        with self._connect() as con:
+            rows = con.execute(
+                """
+                SELECT kind,
+                       SUM(lease_until >= ?),
+                       SUM((lease_until IS NULL OR lease_until < ?) AND available_at <= ?),
+                       SUM((lease_until IS NULL OR lease_until < ?) AND available_at > ?)
+                FROM work_queue GROUP BY kind
+                """,
+                (now, now, now, now, now),
+            ).fetchall()
+            dead = dict(con.execute("SELECT kind, COUNT(*) FROM work_dead GROUP BY kind").fetchall())
+        out = {kind: {"leased": leased or 0, "ready": ready or 0, "delayed": delayed or 0, "dead": 0}
+               for kind, leased, ready, delayed in rows}
+        for kind, count in dead.items():
+            out.setdefault(kind, {"leased": 0, "ready": 0, "delayed": 0, "dead": 0})["dead"] = count
+        return out
+
+
+    def dead_letters(self, kind: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        with self._connect() as con:
+            con.row_factory = sqlite3.Row
+            rows = con.execute(
+                """
+                SELECT id, kind, key, attempts, last_error, failed_at FROM work_dead
+                WHERE ? IS NULL OR kind = ? ORDER BY failed_at DESC LIMIT ?
+                """,
+                (kind, kind, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+    def requeue_dead(self, kind: Optional[str] = None) -> int:
+        now = time.time()
+        with self._transaction() as con:
+            rows = con.execute(
+                "SELECT id, kind, key, payload FROM work_dead WHERE ? IS NULL OR kind = ?", (kind, kind)
+            ).fetchall()
+            con.executemany(
+                """
+                INSERT OR IGNORE INTO work_queue (kind, key, payload, available_at, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                [(row_kind, key, payload, now, now) for _, row_kind, key, payload in rows],
+            )
+            con.executemany("DELETE FROM work_dead WHERE id = ?", [(row[0],) for row in rows])
+        return len(rows)
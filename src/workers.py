@@ -0,0 +1,285 @@
+import argparse
+import datetime as dt
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+
+from settings import (
+    REGIONS, DB_PATH, HTTP_TIMEOUT, INGEST_USE_LLM, INGEST_MODEL, PIPELINE_COMMIT_EVERY, QUEUE_POLL_INTERVAL,
+)
+from src.clustering import StoryClusterer
+from src.db_manager import DBManager
+from src.ingest import Ingester, IngestLockError, ingest_lock
+from src.llm_cache import LLMCache
+from src.metrics import METRICS, Metrics
+from src.news_fetcher import NewsFetcher
+from src.work_queue import NewTask, WorkQueue
+
+
+ROLES = ["fetch", "analyse", "write"]
+
+
+def encode_item(it: Dict) -> Dict:
+    date_dt = it.get("date_dt")
+    return {**it, "date_dt": date_dt.isoformat() if date_dt else None}
+
+
+def decode_item(it: Dict) -> Dict:
+    date_dt = it.get("date_dt")
+    return {**it, "date_dt": dt.datetime.fromisoformat(date_dt) if date_dt else None}
+
+
+class Worker:
+
+    def __init__(
+            self,
+            role: str,
+            queue: WorkQueue,
+            db_manager: DBManager,
+            fetcher: NewsFetcher,
+            ingester: Optional[Ingester] = None,
+            use_llm: bool = INGEST_USE_LLM,
+            model: str = INGEST_MODEL,
+            poll_interval: float = QUEUE_POLL_INTERVAL,
+        ) -> None:
+        if role not in ROLES:
+            raise ValueError(f"role must be one of {ROLES}, got {role!r}")
+        self.logger = logging.getLogger(__name__)
+        self.role = role
+        self.queue = queue
+        self.db_manager = db_manager
+        self.fetcher = fetcher
+        self.ingester = ingester
+        self.use_llm = use_llm
+        self.model = model
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{role}:{uuid.uuid4().hex[:8]}"
+        self.regions = {
+            src["url"]: region
+            for region, conf in REGIONS.items() for src in conf.get("sources", []) if src.get("url")
+        }
+
+
+    def schedule(self) -> int:
+        # The writer doubles as the scheduler: due sources become fetch tasks, which any fetch
+        # worker can pick up. Retries of failing feeds are left to the queue's backoff.
+        now = time.time()
+        urls = self.ingester.due_sources(now)
+        if not urls:
+            return 0
+        added = self.queue.put(
+            ("fetch", url, {"url": url, "region": self.regions[url], "use_llm": self.use_llm, "model": self.model})
+            for url in urls
+        )
+        self.ingester.reschedule(urls, {}, now)
+        return added
+
+
+    def fetch(self, payload: Dict) -> List[NewTask]:
+        url, region = payload["url"], payload["region"]
+        src = next(src for src in REGIONS[region].get("sources", []) if src.get("url") == url)
+        fetched = self.fetcher.fetch_source(src)
+        follow_ups: List[NewTask] = []
+        if fetched is not None:
+            METRICS.count("feed_entries", len(fetched), source=src.get("name"))
+            candidates = self.fetcher.select_candidates(
+                region=region,
+                src=src,
+                fetched=fetched,
+                start_date=self.fetcher.default_start_date(),
+                end_date=dt.date.today(),
+            )
+            follow_ups.extend(
+                ("analyse", it["uid"], {"item": encode_item(it), "use_llm": payload["use_llm"],
+                                        "model": payload["model"]})
+                for it in candidates
+            )
+        else:
+            METRICS.count("feeds_unchanged", source=src.get("name"))
+        # The validators travel through the writer like the rows, and are queued with the
+        # analysis tasks, so they are only saved once the entries are safely in the queue.
+        feed_state = self.fetcher.take_feed_state(url)
+        if feed_state:
+            follow_ups.append(("write", None, {"feed_state": feed_state}))
+        return follow_ups
+
+
+    def run_fetch(self) -> int:
+        tasks = self.queue.lease("fetch", self.owner, limit=self.fetcher.max_workers)
+        if not tasks:
+            return 0
+        self.fetcher.load_feed_state()
+
+        def run(task: Dict) -> None:
+            try:
+                follow_ups = self.fetch(task["payload"])
+            except Exception as e:
+                self.logger.warning(f"Error fetching {task['payload'].get('url')}: {e}")
+                self.queue.fail([task], self.owner, str(e))
+                return
+            self.queue.complete([task], self.owner, follow_ups)
+
+        with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+            list(pool.map(run, tasks))
+        return len(tasks)
+
+
+    def run_analyse(self) -> int:
+        tasks = self.queue.lease("analyse", self.owner, limit=self.fetcher.group_size(use_llm=True))
+        if not tasks:
+            return 0
+        groups: Dict[Tuple[bool, str], List[Dict]] = {}
+        for task in tasks:
+            groups.setdefault((task["payload"]["use_llm"], task["payload"]["model"]), []).append(task)
+        if self.fetcher.clusterer is not None:
+            # Other analysis workers add stories too, so the index is refreshed for every group.
+            self.fetcher.clusterer.load()
+        for (use_llm, model), group in groups.items():
+            try:
+                items = self.fetcher.analyse_group(
+                    [decode_item(task["payload"]["item"]) for task in group], use_llm=use_llm, model=model
+                )
+            except Exception as e:
+                self.logger.exception(f"Analysis of {len(group)} items failed: {e}")
+                self.queue.fail(group, self.owner, str(e))
+                continue
+            self.queue.complete(group, self.owner, [("write", None, {"items": items})] if items else [])
+        return len(tasks)
+
+
+    def run_write(self) -> int:
+        self.schedule()
+        tasks = self.queue.lease("write", self.owner, limit=PIPELINE_COMMIT_EVERY)
+        if not tasks:
+            return 0
+        started_at = dt.datetime.now(dt.timezone.utc)
+        before = METRICS.snapshot()
+        items = [it for task in tasks for it in task["payload"].get("items", [])]
+        feed_states = {}
+        for task in tasks:
+            feed_states.update(task["payload"].get("feed_state", {}))
+        # Upserts are idempotent, so a batch that is written again after a crash between the
+        # commit and complete() changes nothing.
+        inserted, updated = self.db_manager.update(items) if items else (0, 0)
+        self.db_manager.set_feed_states(feed_states)
+        self.queue.complete(tasks, self.owner)
+        if items:
+            self.db_manager.record_run(
+                trigger="queue",
+                started_at=started_at,
+                finished_at=dt.datetime.now(dt.timezone.utc),
+                inserted=inserted,
+                updated=updated,
+                failed_sources=0,
+                stats=Metrics.delta(before, METRICS.snapshot()),
+            )
+        return len(tasks)
+
+
+    def run_once(self) -> int:
+        return getattr(self, f"run_{self.role}")()
+
+
+    def run_forever(self) -> None:
+        self.logger.info(f"Worker {self.owner} started")
+        while True:
+            try:
+                done = self.run_once()
+            except Exception as e:
+                self.logger.exception(f"Worker {self.owner} failed: {e}")
+                done = 0
+            if not done:
+                time.sleep(self.poll_interval)
+
+
+def build_worker(role: str, db_path: str, use_llm: bool, model: str, triage: Optional[List[str]]) -> Worker:
+    db_manager = DBManager(db_path)
+    llm_cache = LLMCache(db_path)
+    clusterer = StoryClusterer(db_path)
+    queue = WorkQueue(db_path)
+    fetcher = NewsFetcher(time_out=HTTP_TIMEOUT, utc=pytz.UTC, db_manager=db_manager, llm_cache=llm_cache,
+                          triage_tiers=triage, clusterer=clusterer)
+    ingester = Ingester(db_manager=db_manager, fetcher=fetcher) if role == "write" else None
+    return Worker(role=role, queue=queue, db_manager=db_manager, fetcher=fetcher, ingester=ingester,
+                  use_llm=use_llm, model=model)
+
+
+def run_worker(role: str, db_path: str, use_llm: bool, model: str, triage: Optional[List[str]], log_level: str):
+    logging.basicConfig(level=log_level, format="%(asctime)s %(levelname)s %(processName)s %(name)s: %(message)s")
+    try:
+        build_worker(role, db_path, use_llm, model, triage).run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run ingestion workers that share a queue in the database.")
+    parser.add_argument("role", choices=[*ROLES, "status", "requeue"],
+                        help="worker role, or status/requeue to inspect the queue and retry dead tasks")
+    parser.add_argument("--processes", type=int, default=1, help="number of worker processes for this role")
+    parser.add_argument("--no-llm", action="store_true", help="queue sources for the heuristic classifier only")
+    parser.add_argument("--model", default=INGEST_MODEL)
+    parser.add_argument("--triage", nargs="*", metavar="TIER",
+                        help="screening tiers run before --model, e.g. heuristic gemma3:270m (none to disable)")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    db_manager = DBManager(args.db)
+    db_manager.init()
+    LLMCache(args.db).init()
+    StoryClusterer(args.db).init()
+    Ingester(db_manager=db_manager, fetcher=None).init()
+    queue = WorkQueue(args.db)
+    queue.init()
+    if args.role == "status":
+        print({"queue": queue.stats(), "dead": queue.dead_letters(limit=20)})
+        return 0
+    if args.role == "requeue":
+        print(f"Requeued {queue.requeue_dead()} tasks")
+        return 0
+
+    worker_args = (args.role, args.db, not args.no_llm, args.model, args.triage, args.log_level)
+    if args.role == "write":
+        # One writer per database: it takes the same lock as src.ingest, so it cannot run next
+        # to a standalone ingester either.
+        if args.processes != 1:
+            parser.error("the write role runs in a single process")
+        try:
+            with ingest_lock(args.db):
+                run_worker(*worker_args)
+        except IngestLockError as e:
+            logging.getLogger(__name__).error(str(e))
+            return 1
+        return 0
+
+    if args.processes == 1:
+        run_worker(*worker_args)
+        return 0
+    processes = [
+        multiprocessing.Process(target=run_worker, args=worker_args, name=f"{args.role}-{i}")
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())